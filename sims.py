@@ -2,19 +2,25 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import folium
-from streamlit_folium import folium_static
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit_folium import folium_static, st_folium
 from folium.plugins import Search
-from folium.plugins import MarkerCluster, HeatMap, MiniMap, Draw, LocateControl, Fullscreen, MousePosition
-from folium import FeatureGroup, GeoJson, TopoJson
-from folium.plugins import MarkerCluster
+from folium.plugins import FastMarkerCluster, HeatMap, MiniMap, Draw, LocateControl, Fullscreen, MousePosition
+from folium import GeoJson
 import io
 import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
-import base64
 from branca.element import Figure, MacroElement
 from jinja2 import Template
 import json
+import os
+import tempfile
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 
@@ -121,29 +127,48 @@ st.markdown("""
 st.markdown('<p class="main-header">📡 Sistem Informasi Manajemen Frekuensi</p>', unsafe_allow_html=True)
 st.markdown('<p style="text-align: center; font-size: 1.2rem;">Aplikasi untuk mengelola dan memvisualisasikan data frekuensi beserta lokasi pengguna</p>', unsafe_allow_html=True)
 
+# Service icon/color lookup table shared by markers, popups and legends
+SERVICE_ICON_MAP = {
+    'Broadcasting': {'icon': 'tower-broadcast', 'color': '#E53935'},  # Red
+    'Mobile': {'icon': 'signal', 'color': '#43A047'},                # Green
+    'Cellular': {'icon': 'tower-cell', 'color': '#1E88E5'},          # Blue
+    'Satellite': {'icon': 'satellite-dish', 'color': '#8E24AA'},     # Purple
+    'Microwave': {'icon': 'wifi', 'color': '#FB8C00'},               # Orange
+    'Radio': {'icon': 'radio', 'color': '#FFB300'},                  # Amber
+    'TV': {'icon': 'tv', 'color': '#546E7A'},                        # Blue Grey
+    'Amateur': {'icon': 'walkie-talkie', 'color': '#6D4C41'},        # Brown
+    'Maritime': {'icon': 'ship', 'color': '#00ACC1'},                # Cyan
+    'Aviation': {'icon': 'plane', 'color': '#7CB342'},               # Light Green
+    'Fixed': {'icon': 'broadcast-tower', 'color': '#5E35B1'},        # Deep Purple
+    'Radar': {'icon': 'satellite', 'color': '#F4511E'}               # Deep Orange
+}
+DEFAULT_SERVICE_ICON = {'icon': 'signal', 'color': '#757575'}  # Grey
+
 # Function to create custom icon based on service type
 def get_service_icon(service):
     """Return custom icon based on service type with improved mapping"""
-    icon_map = {
-        'Broadcasting': {'icon': 'tower-broadcast', 'color': '#E53935'},  # Red
-        'Mobile': {'icon': 'signal', 'color': '#43A047'},                # Green
-        'Cellular': {'icon': 'tower-cell', 'color': '#1E88E5'},          # Blue
-        'Satellite': {'icon': 'satellite-dish', 'color': '#8E24AA'},     # Purple
-        'Microwave': {'icon': 'wifi', 'color': '#FB8C00'},               # Orange
-        'Radio': {'icon': 'radio', 'color': '#FFB300'},                  # Amber
-        'TV': {'icon': 'tv', 'color': '#546E7A'},                        # Blue Grey
-        'Amateur': {'icon': 'walkie-talkie', 'color': '#6D4C41'},        # Brown
-        'Maritime': {'icon': 'ship', 'color': '#00ACC1'},                # Cyan
-        'Aviation': {'icon': 'plane', 'color': '#7CB342'},               # Light Green
-        'Fixed': {'icon': 'broadcast-tower', 'color': '#5E35B1'},        # Deep Purple
-        'Radar': {'icon': 'satellite', 'color': '#F4511E'}               # Deep Orange
-    }
-    
     # Default to signal icon if service not in map
-    if service in icon_map:
-        return icon_map[service]
-    else:
-        return {'icon': 'signal', 'color': '#757575'}  # Grey
+    return SERVICE_ICON_MAP.get(service, DEFAULT_SERVICE_ICON)
+
+# Function to resolve service icons for a whole column at once
+def get_service_styles(services):
+    """Return per-row style codes and the style table for a SERVICE column"""
+    # Look up each distinct service once instead of once per row
+    codes, uniques = pd.factorize(services, use_na_sentinel=False)
+    styles = [get_service_icon(service) for service in uniques]
+    return codes, styles
+
+# Frequency band edges (MHz) and labels, in display order
+FREQ_BAND_EDGES = [-np.inf, 30, 300, 3000, 30000, 300000, np.inf]
+FREQ_BAND_LABELS = [
+    "HF (3-30 MHz)",
+    "VHF (30-300 MHz)",
+    "UHF (300-3000 MHz)",
+    "SHF (3-30 GHz)",
+    "EHF (30-300 GHz)",
+    "THF (>300 GHz)"
+]
+FREQ_BAND_UNKNOWN = "Unknown"
 
 # Function to convert frequency to band
 def get_frequency_band(freq):
@@ -164,6 +189,22 @@ def get_frequency_band(freq):
     else:
         return "THF (>300 GHz)"
 
+# Function to classify a whole frequency column into bands at once
+def classify_frequency_bands(freqs):
+    """Return a Categorical of frequency bands with a fixed band order"""
+    bands = pd.cut(freqs, bins=FREQ_BAND_EDGES, labels=FREQ_BAND_LABELS, right=False)
+    
+    # Missing frequencies get their own category, like get_frequency_band
+    bands = bands.cat.add_categories([FREQ_BAND_UNKNOWN])
+    return bands.fillna(FREQ_BAND_UNKNOWN)
+
+# Function to add derived columns to a validated dataframe
+def add_derived_columns(df):
+    """Compute columns that filters, charts and popups reuse on every rerun"""
+    if 'FREQ_MHZ' in df.columns:
+        df['FREQ_BAND'] = classify_frequency_bands(df['FREQ_MHZ'])
+    return df
+
 # Function to create a beautified popup with antenna icon
 def create_popup_content(row):
     """Create enhanced HTML popup with antenna icon and improved styling"""
@@ -174,7 +215,7 @@ def create_popup_content(row):
     # Check for frequency info and determine band
     freq_band = ""
     if 'FREQ_MHZ' in row and not pd.isna(row['FREQ_MHZ']):
-        band = get_frequency_band(row['FREQ_MHZ'])
+        band = row['FREQ_BAND'] if 'FREQ_BAND' in row else get_frequency_band(row['FREQ_MHZ'])
         freq_band = f"""
         <tr>
             <td style="padding: 5px; font-weight: bold;"><i class="fa fa-broadcast-tower"></i> Frekuensi:</td>
@@ -248,11 +289,236 @@ def create_popup_content(row):
     """
     return popup_html
 
+# Popup fields shipped to the browser for lazily rendered popups
+POPUP_TEXT_COLUMNS = ['STN_NAME', 'SERVICE', 'SUBSERVICE', 'CLNT_NAME', 'CITY', 'FREQ_BAND']
+POPUP_NUMBER_COLUMNS = ['FREQ_MHZ', 'BW_MHZ']
+
+# Function to pack popup fields as compact columnar JSON
+def get_popup_table(map_data):
+    """Return {column: {'values', 'codes'} or {'numbers'}} with text columns dictionary-encoded"""
+    text_columns = {col: map_data[col] for col in POPUP_TEXT_COLUMNS if col in map_data.columns}
+    if 'FREQ_MHZ' in map_data.columns and 'FREQ_BAND' not in text_columns:
+        text_columns['FREQ_BAND'] = classify_frequency_bands(map_data['FREQ_MHZ'])
+    if 'DATE' in map_data.columns:
+        text_columns['DATE'] = pd.to_datetime(map_data['DATE'], errors='coerce').dt.strftime('%d %b %Y')
+    
+    table = {}
+    for col, values in text_columns.items():
+        codes, uniques = pd.factorize(values)
+        table[col] = {'values': [str(value) for value in uniques], 'codes': codes.tolist()}
+    
+    for col in POPUP_NUMBER_COLUMNS:
+        if col in map_data.columns:
+            numbers = map_data[col].astype(object)
+            table[col] = {'numbers': numbers.where(numbers.notna(), None).tolist()}
+    
+    return table
+
+# Browser-side template equivalent to create_popup_content, rendered when a popup opens
+POPUP_TEMPLATE_JS = """
+    var table = %s;
+    function esc(value) {
+        return value === null || value === undefined ? '' : String(value)
+            .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+    }
+    function field(name, id) {
+        var column = table[name];
+        if (!column) { return null; }
+        if (column.numbers) { return column.numbers[id]; }
+        return column.codes[id] < 0 ? null : column.values[column.codes[id]];
+    }
+    function tableRow(icon, label, value) {
+        return '<tr><td style="padding: 5px; font-weight: bold;"><i class="fa fa-' + icon + '"></i> ' + label + ':</td>' +
+            '<td style="padding: 5px;">' + value + '</td></tr>';
+    }
+    function popup(row, style) {
+        var id = row[3], lat = row[0], lng = row[1];
+        var freq = field('FREQ_MHZ', id), bw = field('BW_MHZ', id), date = field('DATE', id);
+        var extra = '';
+        if (freq !== null) {
+            extra += tableRow('broadcast-tower', 'Frekuensi', esc(freq) + ' MHz <span class="band-tag" style="background-color: #E1F5FE; padding: 2px 5px; border-radius: 3px; font-size: 0.8em; margin-left: 5px;">' + esc(field('FREQ_BAND', id)) + '</span>');
+        }
+        if (bw !== null) { extra += tableRow('arrows-alt-h', 'Bandwidth', esc(bw) + ' MHz'); }
+        if (date !== null) { extra += tableRow('calendar-alt', 'Tanggal', esc(date)); }
+        return '<div style="font-family: \\'Segoe UI\\', Tahoma, Geneva, Verdana, sans-serif; min-width: 300px; max-width: 350px; border-radius: 5px;">' +
+            '<div style="background-color: ' + style.color + '; color: white; padding: 10px; border-radius: 5px 5px 0 0; display: flex; align-items: center;">' +
+            '<div style="background-color: rgba(255,255,255,0.2); width: 40px; height: 40px; border-radius: 50%%; display: flex; align-items: center; justify-content: center; margin-right: 10px;">' +
+            '<i class="fa fa-' + style.icon + '" style="font-size: 20px;"></i></div>' +
+            '<div><div style="font-size: 1.2em; font-weight: bold;">' + esc(field('STN_NAME', id)) + '</div>' +
+            '<div style="font-size: 0.9em; opacity: 0.9;">' + esc(field('SERVICE', id)) + ' · ' + esc(field('SUBSERVICE', id)) + '</div></div></div>' +
+            '<div style="padding: 15px; background-color: white; border-radius: 0 0 5px 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">' +
+            '<table style="width: 100%%; border-collapse: collapse;">' +
+            tableRow('building', 'Klien', esc(field('CLNT_NAME', id))) +
+            tableRow('map-marker-alt', 'Kota', esc(field('CITY', id))) +
+            extra +
+            tableRow('location-arrow', 'Koordinat', '<span style="font-family: monospace;">' + lat.toFixed(6) + ', ' + lng.toFixed(6) + '</span>' +
+                '<a href="https://www.google.com/maps/search/?api=1&query=' + lat + ',' + lng + '" target="_blank" style="margin-left: 5px; color: #1E88E5;">' +
+                '<i class="fa fa-external-link-alt"></i></a>') +
+            '</table></div></div>';
+    }
+"""
+
+# Function to build a single client-side marker layer for a whole dataframe
+def build_marker_layer(map_data, lazy_popups=True):
+    """Build one FastMarkerCluster layer with service icons, tooltips and popups"""
+    codes, styles = get_service_styles(map_data['SERVICE'])
+    
+    if lazy_popups:
+        # One compact array per station: [lat, long, style index, row id]; popup fields ship once as a table
+        data = [
+            list(row) for row in zip(
+                map_data['SID_LAT'].tolist(),
+                map_data['SID_LONG'].tolist(),
+                codes.tolist(),
+                range(len(map_data))
+            )
+        ]
+        marker_js = """
+            marker.bindTooltip(function () { return esc(field('STN_NAME', row[3])) + ' - ' + esc(field('SERVICE', row[3])); });
+            marker.bindPopup(function () { return popup(row, styles[row[2]]); }, {maxWidth: 350});"""
+        template_js = POPUP_TEMPLATE_JS % json.dumps(get_popup_table(map_data), separators=(',', ':'))
+    else:
+        # One compact array per station: [lat, long, style index, tooltip, popup]
+        tooltips = (map_data['STN_NAME'].astype(str) + " - " + map_data['SERVICE'].astype(str)).tolist()
+        popups = [create_popup_content(row) for row in map_data.to_dict('records')]
+        data = [
+            list(row) for row in zip(
+                map_data['SID_LAT'].tolist(),
+                map_data['SID_LONG'].tolist(),
+                codes.tolist(),
+                tooltips,
+                popups
+            )
+        ]
+        marker_js = """
+            marker.bindTooltip(row[3]);
+            marker.bindPopup(row[4], {maxWidth: 350});"""
+        template_js = ""
+    
+    # Icons are created once per service in the browser and shared by all markers
+    callback = """
+    (function () {
+        var styles = %s;
+        %s
+        var icons = styles.map(function (style) {
+            return L.AwesomeMarkers.icon({
+                icon: style.icon,
+                prefix: 'fa',
+                markerColor: 'white',
+                iconColor: style.color
+            });
+        });
+        return function (row) {
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icons[row[2]]});%s
+            return marker;
+        };
+    })()
+    """ % (json.dumps(styles), template_js, marker_js)
+    
+    return FastMarkerCluster(data, callback=callback)
+
+# Heatmap density grid settings
+HEATMAP_WEIGHT_OPTIONS = {
+    "Jumlah stasiun": None,
+    "Daya pancar (TX_POWER)": 'TX_POWER',
+    "Bandwidth (BW_MHZ)": 'BW_MHZ'
+}
+HEATMAP_RADIUS = 15
+HEATMAP_MAX_CELLS = 20000
+HEATMAP_GRADIENT = {0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1: 'red'}
+
+# Function to aggregate stations into a weighted density grid for the heatmap
+def get_density_grid(df, zoom, weight_column=None, max_cells=HEATMAP_MAX_CELLS):
+    """Return [lat, lon, weight] per occupied grid cell, at the weighted centroid of its stations"""
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    if weight_column in df.columns:
+        weights = np.nan_to_num(df[weight_column].to_numpy(dtype=np.float64)).clip(min=0)
+        valid &= weights > 0
+    else:
+        weights = np.ones(len(df))
+    lat, lon, weights = lat[valid], lon[valid], weights[valid]
+    if len(lat) == 0:
+        return np.empty((0, 3))
+    
+    # About half the heatmap radius per cell at the initial zoom, coarsened until the grid fits
+    cell = HEATMAP_RADIUS / 2 * 360 / (256 * 2 ** zoom)
+    while True:
+        ix = np.floor((lat - lat.min()) / cell).astype(np.int64)
+        iy = np.floor((lon - lon.min()) / cell).astype(np.int64)
+        cells = ix * (iy.max() + 1) + iy
+        if len(pd.unique(cells)) <= max_cells:
+            break
+        cell *= 2
+    
+    cell_ids, inverse = np.unique(cells, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights)
+    grid = np.column_stack([
+        np.bincount(inverse, weights=lat * weights) / totals,
+        np.bincount(inverse, weights=lon * weights) / totals,
+        totals
+    ])
+    
+    # Leaflet.heat saturates at 1, so scale by a high percentile instead of the maximum
+    # to keep isolated stations visible next to dense cities
+    grid[:, 2] = np.minimum(grid[:, 2] / np.percentile(totals, 95), 1)
+    return grid.round(5)
+
+# Function to get the cached heatmap grid of a (filtered) dataset
+@st.cache_data(max_entries=16)
+def get_heatmap_grid(dataset_id, filter_key, zoom, weight_column, _df):
+    """Return the density grid for the heatmap, cached per dataset, filter, zoom and weight"""
+    return get_density_grid(_df, zoom, weight_column)
+
+# Function to build the heatmap layer from the density grid
+def build_heatmap_layer(grid):
+    """Return a HeatMap layer with one weighted point per grid cell"""
+    return HeatMap(grid.tolist(), radius=HEATMAP_RADIUS, blur=10, gradient=HEATMAP_GRADIENT)
+
+# Required and optional CSV columns
+REQUIRED_COLUMNS = ['CITY', 'CLNT_NAME', 'STN_NAME', 'SERVICE', 'SUBSERVICE', 'SID_LAT', 'SID_LONG']
+OPTIONAL_COLUMNS = ['FREQ_MHZ', 'BW_MHZ', 'DATE', 'TX_POWER', 'ANTENNA_HEIGHT', 'POLARIZATION']
+
+# Column dtypes used while parsing and downcasting uploaded CSV data
+COLUMN_DTYPES = {
+    'CITY': 'category',
+    'CLNT_NAME': 'category',
+    'STN_NAME': 'str',
+    'SERVICE': 'category',
+    'SUBSERVICE': 'category',
+    'SID_LAT': 'float64',
+    'SID_LONG': 'float64',
+    'FREQ_MHZ': 'float64',
+    'BW_MHZ': 'float64',
+    'DATE': 'str',
+    'TX_POWER': 'float32',
+    'ANTENNA_HEIGHT': 'float32',
+    'POLARIZATION': 'category'
+}
+
+# Numeric columns are read as text and parsed per chunk, so one bad value only quarantines its row
+NUMERIC_COLUMNS = [col for col, dtype in COLUMN_DTYPES.items() if dtype.startswith('float')]
+
+# Row-level validation rules: (column, description, predicate on the column's float values).
+# Bit 0 of a row's error mask marks a value that is not a number and rule i sets bit i + 1;
+# rows with any bit set are quarantined
+NON_NUMERIC_RULE = "Nilai tidak numerik"
+VALIDATION_RULES = [
+    ('SID_LAT', "Latitude kosong", np.isnan),
+    ('SID_LONG', "Longitude kosong", np.isnan),
+    ('SID_LAT', "Latitude di luar kisaran -90 hingga 90", lambda values: np.abs(values) > 90),
+    ('SID_LONG', "Longitude di luar kisaran -180 hingga 180", lambda values: np.abs(values) > 180),
+    ('FREQ_MHZ', "Frekuensi tidak positif", lambda values: values <= 0),
+    ('BW_MHZ', "Bandwidth negatif", lambda values: values < 0)
+]
+RULE_DESCRIPTIONS = [NON_NUMERIC_RULE] + [description for _, description, _ in VALIDATION_RULES]
+
 # Function to validate uploaded CSV data
 def validate_csv_data(df):
-    """Validate the uploaded CSV data to ensure it has the required columns"""
-    required_columns = ['CITY', 'CLNT_NAME', 'STN_NAME', 'SERVICE', 'SUBSERVICE', 'SID_LAT', 'SID_LONG']
-    optional_columns = ['FREQ_MHZ', 'BW_MHZ', 'DATE', 'TX_POWER', 'ANTENNA_HEIGHT', 'POLARIZATION']
+    """Validate that the uploaded CSV data has the required columns; row-level checks are in get_row_errors"""
+    required_columns = REQUIRED_COLUMNS
+    optional_columns = OPTIONAL_COLUMNS
     
     # Check for required columns
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -260,18 +526,6 @@ def validate_csv_data(df):
     if missing_columns:
         return False, f"Kolom yang diperlukan tidak ditemukan: {', '.join(missing_columns)}"
     
-    # Check coordinate data
-    if df['SID_LAT'].isnull().any() or df['SID_LONG'].isnull().any():
-        return False, "Beberapa baris memiliki koordinat latitude/longitude yang kosong."
-    
-    # Check if latitude is within valid range (-90 to 90)
-    if (df['SID_LAT'] < -90).any() or (df['SID_LAT'] > 90).any():
-        return False, "Beberapa nilai latitude berada di luar kisaran yang valid (-90 hingga 90)."
-    
-    # Check if longitude is within valid range (-180 to 180)
-    if (df['SID_LONG'] < -180).any() or (df['SID_LONG'] > 180).any():
-        return False, "Beberapa nilai longitude berada di luar kisaran yang valid (-180 hingga 180)."
-    
     # Add warning for optional columns
     warnings = []
     missing_optional = [col for col in optional_columns if col not in df.columns]
@@ -280,81 +534,1783 @@ def validate_csv_data(df):
     
     return True, warnings
 
-# Function to optimize map performance for large datasets
-def optimize_map_data(df, max_markers, sampling_method="random"):
-    """Optimize the dataframe for map display to handle large datasets"""
-    if len(df) <= max_markers:
-        return df
+# Function to evaluate all row-level validation rules at once
+def get_row_errors(df):
+    """Return the chunk with its numeric columns parsed to float64, and a uint8 error bitmask per row"""
+    errors = np.zeros(len(df), dtype=np.uint8)
     
-    if sampling_method == "random":
-        # Simple random sampling
-        return df.sample(max_markers, random_state=42)
+    # Each column is parsed once and shared by all of its rules
+    values = {}
+    non_numeric = {}
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            try:
+                parsed = df[col].astype('float64')
+            except ValueError:
+                # Only chunks with a bad value take the slower per-value parse
+                parsed = pd.to_numeric(df[col], errors='coerce')
+            values[col] = parsed.to_numpy(dtype=np.float64, na_value=np.nan)
+            non_numeric[col] = np.isnan(values[col]) & df[col].notna().to_numpy()
+            errors |= non_numeric[col].astype(np.uint8)
+    for bit, (col, _, failed) in enumerate(VALIDATION_RULES, start=1):
+        if col in values:
+            # A value that did not parse is only reported as non-numeric
+            errors |= (failed(values[col]) & ~non_numeric[col]).astype(np.uint8) << bit
+    return df.assign(**values), errors
+
+# Function to describe error bitmasks
+def describe_row_errors(errors):
+    """Return the failed rule descriptions of each row, joined with "; " """
+    # Only distinct masks are described, then mapped back to the rows
+    masks, inverse = np.unique(errors, return_inverse=True)
+    descriptions = np.array([
+        "; ".join(description for bit, description in enumerate(RULE_DESCRIPTIONS) if mask >> bit & 1)
+        for mask in masks
+    ], dtype=object)
+    return descriptions[inverse]
+
+# Function to count rows failing each rule
+def count_rule_errors(errors):
+    """Return the number of rows failing each rule in RULE_DESCRIPTIONS"""
+    return np.array([np.count_nonzero(errors >> bit & 1) for bit in range(len(RULE_DESCRIPTIONS))])
+
+# Seed for the random parts of map sampling, so reruns draw the same points
+SAMPLING_SEED = 42
+# Stratified sampling: fixed spatial grid per service and guaranteed points per service
+STRATIFIED_GRID_SIDE = 32
+STRATIFIED_MIN_PER_SERVICE = 50
+# Columns identifying a station, hashed into its stable sampling priority
+SAMPLING_KEY_COLUMNS = ['STN_NAME', 'SID_LAT', 'SID_LONG', 'FREQ_MHZ']
+
+# Function to assign each coordinate to an integer grid cell over the data extent
+def get_grid_cells(lat, lon, side):
+    """Return an int64 cell id per point on a side x side grid (-1 for missing coordinates)"""
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    cells = np.full(len(lat), -1, dtype=np.int64)
+    if not valid.any():
+        return cells
+    
+    lat, lon = lat[valid], lon[valid]
+    lat_span = max(lat.max() - lat.min(), 1e-9)
+    lon_span = max(lon.max() - lon.min(), 1e-9)
+    ix = np.minimum(((lat - lat.min()) / lat_span * side).astype(np.int64), side - 1)
+    iy = np.minimum(((lon - lon.min()) / lon_span * side).astype(np.int64), side - 1)
+    cells[valid] = ix * side + iy
+    return cells
+
+# Function to rank rows for stratified map sampling
+def get_stratified_order(df):
+    """Return all row positions ordered so that every prefix is a stratified sample"""
+    n = len(df)
+    
+    # Per-row priority from the station's own values, so it does not depend on filters or reruns
+    key_columns = [col for col in SAMPLING_KEY_COLUMNS if col in df.columns]
+    priority = pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+    
+    # Strata are (SERVICE, spatial cell) on a fixed grid
+    service_codes, _ = pd.factorize(df['SERVICE'], use_na_sentinel=False)
+    cells = get_grid_cells(
+        df['SID_LAT'].to_numpy(dtype=np.float64),
+        df['SID_LONG'].to_numpy(dtype=np.float64),
+        STRATIFIED_GRID_SIDE
+    )
+    strata = service_codes.astype(np.int64) * (STRATIFIED_GRID_SIDE ** 2 + 1) + cells + 1
+    
+    # Rank rows within their stratum by priority; a row's key is its position as a fraction
+    # of the stratum, so taking the smallest keys allocates points proportionally. Each stratum
+    # gets its own offset in [0, 1) from its rows' priorities, so no stratum size is favoured
+    order = np.lexsort((priority, strata))
+    starts = np.flatnonzero(np.r_[True, strata[order][1:] != strata[order][:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    ranks = np.arange(n) - np.repeat(starts, sizes)
+    offsets = np.bitwise_xor.reduceat(priority[order], starts) / 2.0 ** 64
+    key = np.empty(n)
+    key[order] = (ranks + np.repeat(offsets, sizes)) / np.repeat(sizes, sizes)
+    
+    # The best-ranked rows of every service come first, so rare services always get a quota
+    order = np.lexsort((priority, key, service_codes))
+    starts = np.flatnonzero(np.r_[True, service_codes[order][1:] != service_codes[order][:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    ranks = np.arange(n) - np.repeat(starts, sizes)
+    key[order[ranks < STRATIFIED_MIN_PER_SERVICE]] -= 1
+    
+    return np.lexsort((priority, key))
+
+# Function to pick the row positions to show on the map for a large dataset
+def get_sample_positions(df, max_markers, sampling_method="random"):
+    """Return sorted row positions of at most max_markers representative points"""
+    n = len(df)
+    rng = np.random.default_rng(SAMPLING_SEED)
+    if n <= max_markers:
+        return np.arange(n)
+    
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    
+    if sampling_method == "stratified":
+        # Prefix of a fixed order, so a larger max_markers only adds points
+        positions = get_stratified_order(df)[:max_markers]
+    
+    elif sampling_method == "grid":
+        # First point of every occupied grid cell
+        cells = get_grid_cells(lat, lon, max(1, int(np.sqrt(max_markers))))
+        _, first = np.unique(cells, return_index=True)
+        positions = first[cells[first] >= 0]
     
     elif sampling_method == "cluster":
-        # K-means clustering to get representative points
-        # This is a simplified implementation - for real applications, 
-        # consider using scikit-learn for more advanced clustering
-        from sklearn.cluster import KMeans
+        # Spatial hash: refine the grid until about max_markers cells are occupied,
+        # then keep the point nearest each cell centroid for the most populated cells
+        side = max(1, int(np.sqrt(max_markers)))
+        for _ in range(4):
+            cells = get_grid_cells(lat, lon, side)
+            occupied = len(np.unique(cells[cells >= 0]))
+            if occupied >= 0.9 * max_markers or side >= 1 << 15:
+                break
+            side = min(1 << 15, int(side * np.sqrt(max_markers / max(occupied, 1))) + 1)
         
-        # Extract coordinates for clustering
-        coords = df[['SID_LAT', 'SID_LONG']].values
+        valid = np.flatnonzero(cells >= 0)
+        cell_ids, inverse, counts = np.unique(cells[valid], return_inverse=True, return_counts=True)
+        centroid_lat = np.bincount(inverse, weights=lat[valid]) / counts
+        centroid_lon = np.bincount(inverse, weights=lon[valid]) / counts
+        distance = (lat[valid] - centroid_lat[inverse]) ** 2 + (lon[valid] - centroid_lon[inverse]) ** 2
         
-        # Determine number of clusters (max_markers or less)
-        n_clusters = min(max_markers, len(df))
+        order = np.lexsort((distance, inverse))
+        first = order[np.r_[True, inverse[order][1:] != inverse[order][:-1]]]
+        keep = np.argsort(-counts, kind='stable')[:max_markers]
+        positions = valid[first[keep]]
+    
+    else:
+        # Simple random sampling
+        positions = rng.choice(n, max_markers, replace=False)
+    
+    # If we still have too many points, do random sampling
+    if len(positions) > max_markers:
+        positions = rng.choice(positions, max_markers, replace=False)
+    
+    return np.sort(positions)
+
+# Function to get the cached map sample of a (filtered) dataset
+@st.cache_data(max_entries=32)
+def get_map_sample(dataset_id, filter_key, max_markers, sampling_method, _df):
+    """Return the row positions sampled for the map, cached per dataset, filter, size and method"""
+    return get_sample_positions(_df, max_markers, sampling_method)
+
+# Columns with a prebuilt per-value row index for the filter section
+FILTER_COLUMNS = ['CITY', 'SERVICE', 'CLNT_NAME', 'FREQ_BAND']
+
+# Function to group row positions by value for the filter columns
+def build_filter_index(df):
+    """Return {column: {value: sorted row positions}} for the filter columns"""
+    index = {}
+    for col in FILTER_COLUMNS:
+        if col not in df.columns:
+            continue
         
-        # Apply K-means clustering
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        df['cluster'] = kmeans.fit_predict(coords)
+        # Group row positions by value code with one stable sort
+        codes, uniques = pd.factorize(df[col])
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
         
-        # Select one representative point from each cluster
-        result = df.groupby('cluster').apply(lambda x: x.sample(1)).reset_index(drop=True)
-        return result
+        # Missing values (code -1) sort first and are never selectable
+        order = order[len(codes) - counts.sum():]
+        index[col] = dict(zip(uniques.tolist(), np.split(order, np.cumsum(counts)[:-1])))
+    return index
+
+# Function to carry a filter index over to a merged dataset
+def merge_filter_index(index, delta_index, new_positions, offset):
+    """Return the index of the kept base rows, remapped by new_positions, followed by the delta rows at offset"""
+    merged = {}
+    for col in index:
+        merged[col] = {}
+        for value in index[col].keys() | delta_index.get(col, {}).keys():
+            # Remapping keeps base positions sorted, and delta positions all come after them
+            kept = new_positions[index[col].get(value, np.empty(0, dtype=np.intp))]
+            positions = np.concatenate([kept[kept >= 0], delta_index[col].get(value, np.empty(0, dtype=np.intp)) + offset])
+            if len(positions) > 0:
+                merged[col][value] = positions
+    return merged
+
+# Function to build the filter index for a dataset
+@st.cache_resource(max_entries=8)
+def get_filter_index(dataset_id, _df, _merge=None):
+    """Return the filter index, updated from the base dataset's index when _df comes from a merge"""
+    if _merge is not None:
+        base_index = get_filter_index(_merge['base_id'], _merge['base'])
+        return merge_filter_index(base_index, build_filter_index(_merge['delta']), _merge['new_positions'], _merge['offset'])
+    return build_filter_index(_df)
+
+# Function to sort a dataset by frequency and by occupied lower edge
+def build_frequency_index(df):
+    """Return row positions sorted by FREQ_MHZ and by occupied lower edge, for binary search"""
+    freqs = df['FREQ_MHZ'].to_numpy(dtype=np.float64)
     
-    elif sampling_method == "grid":
-        # Grid-based sampling (divide area into grid cells and take samples from each)
-        # Create grid cells based on lat/long
-        lat_bins = pd.cut(df['SID_LAT'], bins=int(np.sqrt(max_markers)))
-        long_bins = pd.cut(df['SID_LONG'], bins=int(np.sqrt(max_markers)))
+    # Stations without bandwidth occupy only their center frequency
+    if 'BW_MHZ' in df.columns:
+        half_widths = np.nan_to_num(df['BW_MHZ'].to_numpy(dtype=np.float64)) / 2
+    else:
+        half_widths = np.zeros(len(freqs))
+    
+    # Missing frequencies sort last and are left out of the index
+    valid_count = int(np.count_nonzero(~np.isnan(freqs)))
+    order = np.argsort(freqs, kind='stable')[:valid_count]
+    
+    lower_edges = freqs - half_widths
+    edge_order = np.argsort(lower_edges, kind='stable')[:valid_count]
+    
+    return {
+        'order': order,
+        'freqs': freqs[order],
+        'edge_order': edge_order,
+        'lower_edges': lower_edges[edge_order],
+        'upper_edges': (freqs + half_widths)[edge_order],
+        'max_width': float(2 * half_widths.max()) if len(half_widths) else 0.0
+    }
+
+# Function to carry a frequency index over to a merged dataset
+def merge_frequency_index(freq_index, delta_index, new_positions, offset):
+    """Return the index of the kept base rows merged with the delta rows by binary insertion instead of a full sort"""
+    # Kept base rows stay in order; delta rows go after equal keys, as a stable sort of the merged rows would put them
+    kept = new_positions[freq_index['order']]
+    keep = kept >= 0
+    freqs = freq_index['freqs'][keep]
+    insert_at = np.searchsorted(freqs, delta_index['freqs'], side='right')
+    
+    kept_edges = new_positions[freq_index['edge_order']]
+    keep_edges = kept_edges >= 0
+    lower_edges = freq_index['lower_edges'][keep_edges]
+    edge_insert_at = np.searchsorted(lower_edges, delta_index['lower_edges'], side='right')
+    
+    return {
+        'order': np.insert(kept[keep], insert_at, delta_index['order'] + offset),
+        'freqs': np.insert(freqs, insert_at, delta_index['freqs']),
+        'edge_order': np.insert(kept_edges[keep_edges], edge_insert_at, delta_index['edge_order'] + offset),
+        'lower_edges': np.insert(lower_edges, edge_insert_at, delta_index['lower_edges']),
+        'upper_edges': np.insert(freq_index['upper_edges'][keep_edges], edge_insert_at, delta_index['upper_edges']),
+        # An upper bound is enough for the overlap query, so removed rows may keep it wide
+        'max_width': max(freq_index['max_width'], delta_index['max_width'])
+    }
+
+# Function to build the sorted frequency index for a dataset
+@st.cache_resource(max_entries=8)
+def get_frequency_index(dataset_id, _df, _merge=None):
+    """Return the frequency index, updated from the base dataset's index when _df comes from a merge"""
+    if _merge is not None:
+        base_index = get_frequency_index(_merge['base_id'], _merge['base'])
+        return merge_frequency_index(base_index, build_frequency_index(_merge['delta']), _merge['new_positions'], _merge['offset'])
+    return build_frequency_index(_df)
+
+# Function to locate a frequency range in the sorted frequency index
+def get_frequency_slice(freq_index, low, high):
+    """Return the slice of the sorted index with low <= FREQ_MHZ <= high"""
+    start = np.searchsorted(freq_index['freqs'], low, side='left')
+    stop = np.searchsorted(freq_index['freqs'], high, side='right')
+    return slice(start, stop)
+
+# Function to find stations whose center frequency lies in a range
+def query_frequency_range(freq_index, low, high):
+    """Return sorted row positions with low <= FREQ_MHZ <= high"""
+    return np.sort(freq_index['order'][get_frequency_slice(freq_index, low, high)])
+
+# Function to find stations whose occupied channel overlaps a range
+def query_frequency_overlap(freq_index, low, high):
+    """Return sorted row positions whose FREQ_MHZ ± BW_MHZ/2 interval overlaps [low, high]"""
+    # Only channels starting within max_width below the range can still reach into it
+    start = np.searchsorted(freq_index['lower_edges'], low - freq_index['max_width'], side='left')
+    stop = np.searchsorted(freq_index['lower_edges'], high, side='right')
+    
+    candidates = slice(start, stop)
+    overlapping = freq_index['upper_edges'][candidates] >= low
+    return np.sort(freq_index['edge_order'][candidates][overlapping])
+
+# Large-data chart settings: chart payloads stay bounded whatever the row count
+FREQ_HISTOGRAM_BINS = 50
+BOX_MAX_OUTLIERS = 200
+SCATTER_3D_MAX_POINTS = 5000
+
+# Function to count sorted frequencies into equal-width bins
+def get_frequency_histogram(sorted_freqs, nbins=FREQ_HISTOGRAM_BINS, log_scale=False):
+    """Return bin edges and counts for sorted frequencies using binary search"""
+    # Log bins span only positive frequencies, so HF to EHF gets the same resolution per decade
+    if log_scale:
+        sorted_freqs = sorted_freqs[np.searchsorted(sorted_freqs, 0, side='right'):]
+    if len(sorted_freqs) == 0:
+        return np.array([0.0, 1.0]), np.zeros(1, dtype=np.intp)
+    
+    low, high = sorted_freqs[0], sorted_freqs[-1]
+    if log_scale:
+        if low == high:
+            low, high = low / 2, high * 2
+        edges = np.geomspace(low, high, nbins + 1)
+    else:
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, nbins + 1)
+    
+    # Bins are closed on the left, and the last bin also includes its right edge
+    bounds = np.append(
+        np.searchsorted(sorted_freqs, edges[:-1], side='left'),
+        np.searchsorted(sorted_freqs, edges[-1], side='right')
+    )
+    return edges, np.diff(bounds)
+
+# Function to compute box plot statistics per group
+def get_frequency_box_stats(df, by='SERVICE', max_outliers=BOX_MAX_OUTLIERS):
+    """Return per-group quartiles and Tukey fences, plus at most max_outliers outliers per group"""
+    freqs = df['FREQ_MHZ'].to_numpy(dtype=np.float64)
+    # Rows without a group would get the -1 factorize code, so they are dropped with missing frequencies
+    valid = ~np.isnan(freqs) & df[by].notna().to_numpy()
+    codes, groups = pd.factorize(df[by].to_numpy()[valid], sort=True)
+    values = freqs[valid]
+    if len(values) == 0:
+        return pd.DataFrame(columns=[by, 'COUNT', 'Q1', 'MEDIAN', 'Q3', 'LOWER_FENCE', 'UPPER_FENCE']), pd.DataFrame(columns=[by, 'FREQ_MHZ'])
+    
+    # One sort by (group, frequency) answers every quantile by position
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(values)])
+    
+    def quantile(q):
+        # Linear interpolation between the closest ranks, as in numpy's default method
+        position = starts + q * (sizes - 1)
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, starts + sizes - 1)
+        return values[below] + (values[above] - values[below]) * (position - below)
+    
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    
+    # Whiskers end at the most extreme values within 1.5 IQR of the box
+    group_of = np.repeat(np.arange(len(starts)), sizes)
+    inside = (values >= (q1 - 1.5 * iqr)[group_of]) & (values <= (q3 + 1.5 * iqr)[group_of])
+    lower_fence = np.minimum.reduceat(np.where(inside, values, np.inf), starts)
+    upper_fence = np.maximum.reduceat(np.where(inside, values, -np.inf), starts)
+    
+    stats = pd.DataFrame({
+        by: groups[codes[starts]],
+        'COUNT': sizes,
+        'Q1': q1,
+        'MEDIAN': median,
+        'Q3': q3,
+        'LOWER_FENCE': lower_fence,
+        'UPPER_FENCE': upper_fence
+    })
+    
+    # Outliers thinned to evenly spaced ranks within each group
+    outlier = np.flatnonzero(~inside)
+    outlier_groups = group_of[outlier]
+    outlier_starts = np.searchsorted(outlier_groups, np.arange(len(starts)))
+    outlier_counts = np.bincount(outlier_groups, minlength=len(starts))
+    rank = np.arange(len(outlier)) - outlier_starts[outlier_groups]
+    total = outlier_counts[outlier_groups]
+    keep = (rank * max_outliers) // total != ((rank - 1) * max_outliers) // total
+    outlier = outlier[keep]
+    outliers = pd.DataFrame({by: groups[codes[outlier]], 'FREQ_MHZ': values[outlier]})
+    
+    return stats, outliers
+
+# Function to reduce points for the 3D scatter with a density-aware voxel grid
+def get_voxel_sample(df, max_points=SCATTER_3D_MAX_POINTS, log_scale=False):
+    """Return one representative row per occupied (SERVICE, voxel), with COUNT rows behind it"""
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    freqs = df['FREQ_MHZ'].to_numpy(dtype=np.float64)
+    if log_scale:
+        freqs = np.log10(np.where(freqs > 0, freqs, np.nan))
+    valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon) | np.isnan(freqs)))
+    service_codes, _ = pd.factorize(df['SERVICE'], use_na_sentinel=False)
+    
+    # Coordinates scaled to [0, 1] so one side length applies to every axis
+    axes = []
+    for values in (lat[valid], lon[valid], freqs[valid]):
+        span = max(values.max() - values.min(), 1e-9) if len(values) else 1.0
+        axes.append((values - (values.min() if len(values) else 0)) / span)
+    
+    def get_voxels(side):
+        ix, iy, iz = (np.minimum((axis * side).astype(np.int64), side - 1) for axis in axes)
+        return (service_codes[valid].astype(np.int64) * side + ix) * side ** 2 + iy * side + iz
+    
+    # Largest grid whose occupied voxels fit the budget: sparse points keep their own voxel
+    # while dense regions collapse into one weighted point
+    voxels = np.arange(len(valid), dtype=np.int64)
+    if len(valid) > max_points:
+        low, high = 1, 1024
+        voxels = get_voxels(low)
+        while high - low > 1:
+            side = (low + high) // 2
+            candidate = get_voxels(side)
+            if len(pd.unique(candidate)) <= max_points:
+                low, voxels = side, candidate
+            else:
+                high = side
+    
+    _, first, counts = np.unique(voxels, return_index=True, return_counts=True)
+    sample = df.iloc[valid[first]][['SID_LAT', 'SID_LONG', 'FREQ_MHZ', 'SERVICE']].copy()
+    sample['COUNT'] = counts
+    return sample
+
+# Function to get the cached box plot statistics of a filtered dataset
+@st.cache_data(max_entries=16)
+def get_frequency_box_data(dataset_id, filter_key, _df):
+    """Return box plot statistics and thinned outliers per service"""
+    return get_frequency_box_stats(_df, 'SERVICE')
+
+# Function to get the cached 3D scatter points of a filtered dataset
+@st.cache_data(max_entries=16)
+def get_scatter_3d_data(dataset_id, filter_key, log_scale, _df):
+    """Return the voxel-reduced 3D scatter points"""
+    return get_voxel_sample(_df, SCATTER_3D_MAX_POINTS, log_scale)
+
+# Function to answer a filter combination from the filter index
+@st.cache_data(max_entries=64)
+def get_filtered_positions(dataset_id, selections, freq_range, _index, _freq_index, include_overlap=False):
+    """Return sorted row positions matching all selected values, or None if nothing is filtered"""
+    matches = [
+        _index[col].get(value, np.empty(0, dtype=np.intp))
+        for col, value in selections if value != "All"
+    ]
+    
+    # Frequency range answered by binary search on the sorted frequency index
+    if freq_range is not None:
+        query = query_frequency_overlap if include_overlap else query_frequency_range
+        matches.append(query(_freq_index, *freq_range))
+    
+    if not matches:
+        return None
+    
+    # Intersect from the smallest set up
+    matches.sort(key=len)
+    positions = matches[0]
+    for other in matches[1:]:
+        positions = np.intersect1d(positions, other, assume_unique=True)
+    return positions
+
+# Dimensions of the aggregate cube behind the metrics and charts
+CUBE_DIMENSIONS = ['SERVICE', 'SUBSERVICE', 'CITY', 'CLNT_NAME', 'FREQ_BAND']
+
+# Function to aggregate a dataframe into the cube
+def build_aggregate_cube(df):
+    """Return one row per observed dimension combination with counts, coordinate sums and frequency moments"""
+    dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    has_coords = ~(np.isnan(lat) | np.isnan(lon))
+    
+    measures = {
+        'COUNT': np.ones(len(df), dtype=np.int64),
+        'COORD_COUNT': has_coords.astype(np.int64),
+        'LAT_SUM': np.where(has_coords, lat, 0.0),
+        'LONG_SUM': np.where(has_coords, lon, 0.0)
+    }
+    if 'FREQ_MHZ' in df.columns:
+        freqs = df['FREQ_MHZ'].to_numpy(dtype=np.float64)
+        has_freq = ~np.isnan(freqs)
+        measures['FREQ_COUNT'] = has_freq.astype(np.int64)
+        measures['FREQ_SUM'] = np.where(has_freq, freqs, 0.0)
+        measures['FREQ_SUMSQ'] = np.where(has_freq, freqs ** 2, 0.0)
+    
+    # Missing dimension values are kept as their own cells so totals stay exact
+    measures = pd.DataFrame(measures, index=df.index)
+    return measures.groupby([df[col] for col in dims], observed=True, dropna=False, sort=False).sum().reset_index()
+
+# Function to fold newly appended rows into an existing cube
+def merge_aggregate_cubes(cube, other, sign=1):
+    """Return the cube of the rows behind cube plus, or with sign=-1 minus, the rows behind other"""
+    dims = [col for col in CUBE_DIMENSIONS if col in cube.columns]
+    if sign != 1:
+        other = other.copy()
+        measures = [col for col in other.columns if col not in dims]
+        other[measures] = other[measures] * sign
+    
+    combined = pd.concat([cube, other], ignore_index=True)
+    merged = combined.groupby(dims, observed=True, dropna=False, sort=False).sum().reset_index()
+    return merged[merged['COUNT'] != 0].reset_index(drop=True)
+
+# Function to get the cached aggregate cube of a (filtered) dataset
+@st.cache_resource(max_entries=16)
+def get_aggregate_cube(dataset_id, filter_key, _df, _merge=None):
+    """Return the aggregate cube, built once per dataset and filter, or updated from the base cube after a merge"""
+    if _merge is not None:
+        base_cube = get_aggregate_cube(_merge['base_id'], None, _merge['base'])
+        removed = _merge['base'].iloc[np.flatnonzero(_merge['new_positions'] < 0)]
+        cube = merge_aggregate_cubes(base_cube, build_aggregate_cube(removed), sign=-1)
+        return merge_aggregate_cubes(cube, build_aggregate_cube(_merge['delta']))
+    return build_aggregate_cube(_df)
+
+# Function to restrict a cube to the selected dimension values
+def slice_aggregate_cube(cube, selections, drop_unknown_band=False):
+    """Return the cube cells matching all non-"All" selections"""
+    mask = np.ones(len(cube), dtype=bool)
+    for col, value in selections:
+        if value != "All" and col in cube.columns:
+            mask &= (cube[col] == value).to_numpy()
+    
+    # A full frequency range still leaves out stations without a frequency
+    if drop_unknown_band and 'FREQ_BAND' in cube.columns:
+        mask &= (cube['FREQ_BAND'] != FREQ_BAND_UNKNOWN).to_numpy()
+    return cube[mask]
+
+# Function to count rows per value from the cube
+def get_cube_counts(cube, column, sort=True):
+    """Return row counts per value like value_counts, without missing or unused values"""
+    counts = cube.groupby(column, observed=True)['COUNT'].sum()
+    counts = counts[counts > 0]
+    if sort:
+        counts = counts.sort_values(ascending=False, kind='stable')
+    return counts.rename('count')
+
+# Function to count distinct values from the cube
+def get_cube_nunique(cube, column):
+    """Return the number of distinct non-missing values"""
+    return int(cube[column].nunique())
+
+# Function to get frequency mean and standard deviation from the cube
+def get_cube_frequency_stats(cube, by):
+    """Return mean and sample standard deviation of FREQ_MHZ per group, from count, sum and sum of squares"""
+    sums = cube.groupby(by, observed=True)[['FREQ_COUNT', 'FREQ_SUM', 'FREQ_SUMSQ']].sum()
+    sums = sums[sums['FREQ_COUNT'] > 0]
+    count = sums['FREQ_COUNT']
+    mean = sums['FREQ_SUM'] / count
+    variance = ((sums['FREQ_SUMSQ'] - count * mean ** 2) / (count - 1)).clip(lower=0)
+    return pd.DataFrame({'FREQ_MHZ': mean, 'FREQ_STD': np.sqrt(variance.where(count > 1))}).reset_index()
+
+# Function to get the overall mean frequency from the cube
+def get_cube_frequency_mean(cube):
+    """Return the mean FREQ_MHZ over all cells, or NaN without frequencies"""
+    count = cube['FREQ_COUNT'].sum()
+    return cube['FREQ_SUM'].sum() / count if count else np.nan
+
+# Function to cross-tabulate two dimensions from the cube
+def get_cube_crosstab(cube, rows, columns):
+    """Return row counts like pd.crosstab(df[rows], df[columns])"""
+    return cube.groupby([rows, columns], observed=True)['COUNT'].sum().unstack(fill_value=0)
+
+# Function to get the mean location per value from the cube
+def get_cube_centroids(cube, column):
+    """Return mean SID_LAT/SID_LONG and row count per value"""
+    sums = cube.groupby(column, observed=True)[['COUNT', 'COORD_COUNT', 'LAT_SUM', 'LONG_SUM']].sum()
+    sums = sums[sums['COORD_COUNT'] > 0]
+    return pd.DataFrame({
+        'SID_LAT': sums['LAT_SUM'] / sums['COORD_COUNT'],
+        'SID_LONG': sums['LONG_SUM'] / sums['COORD_COUNT'],
+        'COUNT': sums['COUNT']
+    }).reset_index()
+
+# Viewport tiling settings
+VIEWPORT_DISPLAY_MODE = "Viewport (semua titik)"
+TILE_MAX_ZOOM = 16
+VIEWPORT_TILE_POINTS = 300  # tiles with more stations are drawn as clusters
+VIEWPORT_CLUSTER_LEVELS = 2  # clusters are cells this many zoom levels below the tile
+VIEWPORT_MAX_TILES = 64
+CLUSTER_MAX_ZOOM = 14  # finest precomputed cluster level
+
+# Function to interleave tile x/y bits into quadtree (Morton) codes
+def interleave_tile_bits(x, y):
+    """Return Morton codes for integer tile coordinates below 2**16"""
+    def spread(v):
+        v = np.asarray(v, dtype=np.uint64)
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+    return spread(x) | (spread(y) << np.uint64(1))
+
+# Function to convert coordinates to web map tile coordinates
+def get_tile_xy(lat, lon, zoom):
+    """Return integer slippy-map tile x/y for coordinates at a zoom level"""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = np.floor((np.asarray(lon) + 180) / 360 * n)
+    y = np.floor((1 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+# Function to build the quadtree index of a (filtered) dataset
+@st.cache_resource(max_entries=16)
+def get_spatial_index(dataset_id, filter_key, _df):
+    """Return row positions sorted by Morton code so every map tile is one contiguous slice"""
+    lat = _df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = _df['SID_LONG'].to_numpy(dtype=np.float64)
+    codes = interleave_tile_bits(*get_tile_xy(lat, lon, TILE_MAX_ZOOM))
+    order = np.argsort(codes, kind='stable')
+    return {'codes': codes[order], 'order': order, 'lat': lat[order], 'lon': lon[order]}
+
+# Function to precompute the cluster hierarchy of a (filtered) dataset
+@st.cache_resource(max_entries=16)
+def get_cluster_hierarchy(dataset_id, filter_key, _df):
+    """Return, per zoom level, grid cell centroids with counts and a per-service breakdown"""
+    spatial_index = get_spatial_index(dataset_id, filter_key, _df)
+    codes = spatial_index['codes']
+    
+    service_codes, services = pd.factorize(_df['SERVICE'], use_na_sentinel=False)
+    service_codes = service_codes[spatial_index['order']]
+    
+    levels = {}
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        # Cells of one zoom level are contiguous runs of the sorted Morton codes
+        cells = codes >> np.uint64(2 * (TILE_MAX_ZOOM - zoom))
+        run_starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]]) if len(cells) else np.empty(0, dtype=np.intp)
+        counts = np.diff(np.r_[run_starts, len(cells)])
+        run_ids = np.repeat(np.arange(len(run_starts)), counts)
         
-        df['grid_cell'] = list(zip(lat_bins, long_bins))
+        levels[zoom] = {
+            'cells': cells[run_starts],
+            'lat': np.add.reduceat(spatial_index['lat'], run_starts) / counts if len(counts) else np.empty(0),
+            'lon': np.add.reduceat(spatial_index['lon'], run_starts) / counts if len(counts) else np.empty(0),
+            'count': counts,
+            'services': np.bincount(
+                run_ids * len(services) + service_codes,
+                minlength=len(run_starts) * len(services)
+            ).reshape(len(run_starts), len(services)).astype(np.int32)
+        }
+    
+    return {'services': [str(service) for service in services], 'levels': levels}
+
+# Function to select what is visible in a map viewport
+def query_viewport(spatial_index, hierarchy, bounds, zoom):
+    """Return (row positions to draw as points, cluster cells) for the tiles in view"""
+    zoom = int(np.clip(round(zoom), 0, TILE_MAX_ZOOM))
+    south, west = bounds['_southWest']['lat'], bounds['_southWest']['lng']
+    north, east = bounds['_northEast']['lat'], bounds['_northEast']['lng']
+    
+    (x0, x1), (y0, y1) = get_tile_xy(np.array([north, south]), np.array([west, east]), zoom)
+    
+    # Very wide views are answered one zoom level up so the tile count stays bounded
+    while zoom > 0 and (x1 - x0 + 1) * (y1 - y0 + 1) > VIEWPORT_MAX_TILES:
+        zoom -= 1
+        x0, x1, y0, y1 = x0 // 2, x1 // 2, y0 // 2, y1 // 2
+    
+    shift = np.uint64(2 * (TILE_MAX_ZOOM - zoom))
+    codes = spatial_index['codes']
+    
+    # Clusters come from the precomputed level a few zooms below the tile
+    cluster_zoom = min(zoom + VIEWPORT_CLUSTER_LEVELS, CLUSTER_MAX_ZOOM)
+    level = hierarchy['levels'][cluster_zoom]
+    
+    point_slices = []
+    cluster_slices = []
+    for tx in range(x0, x1 + 1):
+        for ty in range(y0, y1 + 1):
+            tile_code = interleave_tile_bits(tx, ty)
+            first_code = tile_code << shift
+            start, stop = np.searchsorted(codes, [first_code, first_code + (np.uint64(1) << shift)])
+            if stop - start <= VIEWPORT_TILE_POINTS:
+                point_slices.append(spatial_index['order'][start:stop])
+                continue
+            
+            # Dense tile: take its cells from the cluster level (or the one cell containing it)
+            if cluster_zoom >= zoom:
+                cell_shift = np.uint64(2 * (cluster_zoom - zoom))
+                first_cell, last_cell = tile_code << cell_shift, (tile_code + np.uint64(1)) << cell_shift
+            else:
+                first_cell = tile_code >> np.uint64(2 * (zoom - cluster_zoom))
+                last_cell = first_cell + np.uint64(1)
+            cell_start, cell_stop = np.searchsorted(level['cells'], [first_cell, last_cell])
+            cluster_slices.append(np.arange(cell_start, cell_stop))
+    
+    points = np.concatenate(point_slices) if point_slices else np.empty(0, dtype=np.intp)
+    
+    # Neighbouring dense tiles can share a coarse cell, so keep each cell once
+    cells = np.unique(np.concatenate(cluster_slices)) if cluster_slices else np.empty(0, dtype=np.intp)
+    clusters = {key: level[key][cells] for key in ('lat', 'lon', 'count', 'services')}
+    return points, clusters
+
+# Function to build the map layer for the current viewport
+def build_viewport_layer(df, spatial_index, hierarchy, bounds, zoom, lazy_popups=True):
+    """Build a FeatureGroup with full-resolution markers and precomputed clusters for a viewport"""
+    points, clusters = query_viewport(spatial_index, hierarchy, bounds, zoom)
+    layer = folium.FeatureGroup(name="Stasiun")
+    
+    if len(points):
+        build_marker_layer(df.iloc[np.sort(points)], lazy_popups).add_to(layer)
+    
+    if len(clusters['count']):
+        services = hierarchy['services']
+        features = []
+        for lat, lon, count, breakdown in zip(clusters['lat'], clusters['lon'], clusters['count'], clusters['services']):
+            # Colour by the dominant service and list the top services in the tooltip
+            top = np.argsort(breakdown)[::-1][:3]
+            summary = ", ".join(f"{services[i]} {breakdown[i]:,}" for i in top if breakdown[i] > 0)
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+                'properties': {
+                    'label': f"{int(count):,} stasiun ({summary})",
+                    'style': {
+                        'radius': min(30, 6 + 4 * float(np.log10(count))),
+                        'color': get_service_icon(services[top[0]])['color'],
+                        'fillColor': get_service_icon(services[top[0]])['color']
+                    }
+                }
+            })
+        GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            marker=folium.CircleMarker(fill=True, fill_opacity=0.6, weight=1),
+            style_function=lambda feature: feature['properties']['style'],
+            tooltip=folium.GeoJsonTooltip(fields=['label'], labels=False)
+        ).add_to(layer)
+    
+    return layer, len(points), int(clusters['count'].sum())
+
+# Function to render a folium map to HTML once per set of map inputs
+@st.cache_data(max_entries=16)
+def get_map_html(map_key, _build_map):
+    """Return the rendered page of the map built by _build_map, cached per map_key"""
+    return folium.Figure().add_child(_build_map()).render()
+
+# Function to show rendered map HTML like folium_static
+def show_map_html(html, width, height):
+    """Embed a rendered map page in the app"""
+    st.iframe(html, width=width, height=height + 10)
+
+# Function to get the viewport a keyed st_folium map last reported
+def get_map_viewport(map_key, view_id, df, default_zoom):
+    """Return (bounds, zoom) from the last map interaction, or the data extent for a new view"""
+    # A different dataset, filter or base map remounts the map, so its old viewport is stale
+    if st.session_state.get(f"{map_key}_view_id") != view_id:
+        st.session_state[f"{map_key}_view_id"] = view_id
+        st.session_state.pop(map_key, None)
+    
+    state = st.session_state.get(map_key) or {}
+    bounds = state.get('bounds')
+    if bounds and bounds['_southWest']['lat'] is not None and state.get('zoom') is not None:
+        return bounds, state['zoom']
+    
+    bounds = {
+        '_southWest': {'lat': float(df['SID_LAT'].min()), 'lng': float(df['SID_LONG'].min())},
+        '_northEast': {'lat': float(df['SID_LAT'].max()), 'lng': float(df['SID_LONG'].max())}
+    }
+    return bounds, default_zoom
+
+# Widgets in closed tabs are not rendered, and Streamlit then drops their state;
+# their settings are kept under a separate key and passed back as the widget value
+def get_saved_setting(key, default):
+    """Return the saved setting of a widget key, or the default before it was first changed"""
+    return st.session_state.get(f"saved_{key}", default)
+
+# Function to get the option index of a saved selectbox or radio setting
+def get_saved_index(key, options, default=0):
+    """Return the index of the saved setting in options, or the default when it is no longer an option"""
+    saved = get_saved_setting(key, None)
+    return options.index(saved) if saved in options else default
+
+# Function to save a widget's value when it changes
+def save_setting(key):
+    """Copy the widget value to its saved setting"""
+    st.session_state[f"saved_{key}"] = st.session_state[key]
+
+# Text search settings
+SEARCH_COLUMNS = {'CITY': 'Kota', 'STN_NAME': 'Stasiun', 'CLNT_NAME': 'Klien'}
+SEARCH_TOP_K = 20
+SEARCH_CANDIDATES = 200  # fuzzy candidates per column checked in detail
+SEARCH_MIN_SIMILARITY = 0.3
+
+# Function to normalize text for searching
+def normalize_search_text(values):
+    """Return lowercase, stripped text without diacritics"""
+    values = pd.Series(values, dtype=object).fillna("").astype(str)
+    
+    # Only non-ASCII values need Unicode decomposition
+    non_ascii = ~values.str.isascii()
+    if non_ascii.any():
+        values = values.copy()
+        values[non_ascii] = (
+            values[non_ascii].str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        )
+    return values.str.lower().str.strip()
+
+# Function to compute the trigrams of normalized terms
+def get_trigram_codes(terms, trailing_pad=True):
+    """Return (term ids, trigram codes) with each trigram packed as three 21-bit code points"""
+    padded = "  " + terms + (" " if trailing_pad else "")
+    lengths = padded.str.len().to_numpy()
+    
+    # All terms as one flat code point buffer, so memory follows the total text length
+    chars = np.frombuffer("".join(padded.tolist()).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32).astype(np.uint64)
+    if len(chars) < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    codes = (chars[:-2] << np.uint64(42)) | (chars[1:-1] << np.uint64(21)) | chars[2:]
+    del chars
+    
+    # Keep the trigrams that start and end inside one term
+    gram_counts = np.maximum(lengths - 2, 0)
+    term_ids = np.repeat(np.arange(len(lengths)), gram_counts)
+    starts = np.repeat(np.cumsum(lengths) - lengths - np.cumsum(gram_counts) + gram_counts, gram_counts)
+    return term_ids, codes[starts + np.arange(len(term_ids))]
+
+# Function to build the text search index of a dataset
+@st.cache_resource(max_entries=4)
+def get_search_index(dataset_id, _df):
+    """Return a trigram index and row positions for every distinct value of the search columns"""
+    index = {}
+    for col in SEARCH_COLUMNS:
+        if col not in _df.columns:
+            continue
         
-        # Take samples from each grid cell
-        result = df.groupby('grid_cell', observed=False).apply(
-            lambda x: x.sample(min(1, len(x)), random_state=42)
-        ).reset_index(drop=True)
+        codes, values = pd.factorize(_df[col])
+        terms = normalize_search_text(values)
+        term_ids, grams = get_trigram_codes(terms)
         
-        # If we still have too many points, do random sampling
-        if len(result) > max_markers:
-            result = result.sample(max_markers, random_state=42)
-            
-        return result
+        # Posting lists: term ids grouped by trigram
+        order = np.argsort(grams)
+        grams = grams[order]
+        gram_starts = np.flatnonzero(np.r_[True, grams[1:] != grams[:-1]]) if len(grams) else np.empty(0, dtype=np.intp)
+        
+        # Row positions grouped by value
+        row_order = np.argsort(codes, kind='stable')
+        row_counts = np.bincount(codes[codes >= 0], minlength=len(values))
+        row_order = row_order[len(codes) - row_counts.sum():]
+        
+        index[col] = {
+            'values': np.asarray(values, dtype=object),
+            'terms': terms.to_numpy(dtype=object),
+            'grams': grams[gram_starts],
+            'gram_offsets': np.r_[gram_starts, len(grams)],
+            'postings': term_ids[order].astype(np.int32),
+            'gram_counts': np.bincount(term_ids, minlength=len(values)),
+            'row_order': row_order,
+            'row_offsets': np.r_[0, np.cumsum(row_counts)]
+        }
+    return index
+
+# Function to search the text index
+def search_text_index(search_index, query, top_k=SEARCH_TOP_K):
+    """Return the top_k values matching query, ranked prefix > word prefix > substring > fuzzy"""
+    query = normalize_search_text([query]).iloc[0]
+    results = []
+    if not query:
+        return pd.DataFrame(columns=['COLUMN', 'KATEGORI', 'NILAI', 'JUMLAH', 'SKOR', 'VALUE_ID'])
+    
+    # A query without trailing padding also matches terms it is only a prefix of
+    _, query_grams = get_trigram_codes(pd.Series([query]), trailing_pad=False)
+    query_grams = np.unique(query_grams)
+    
+    for col, entry in search_index.items():
+        # Count shared trigrams per term from the posting lists
+        slots = np.searchsorted(entry['grams'], query_grams)
+        slots = slots[slots < len(entry['grams'])]
+        slots = slots[np.isin(entry['grams'][slots], query_grams)]
+        if not len(slots):
+            continue
+        postings = np.concatenate([
+            entry['postings'][entry['gram_offsets'][slot]:entry['gram_offsets'][slot + 1]] for slot in slots
+        ])
+        hits = np.bincount(postings, minlength=len(entry['terms']))
+        
+        candidates = np.flatnonzero(hits)
+        if len(candidates) > SEARCH_CANDIDATES:
+            candidates = candidates[np.argpartition(-hits[candidates], SEARCH_CANDIDATES)[:SEARCH_CANDIDATES]]
+        
+        for value_id in candidates:
+            term = entry['terms'][value_id]
+            if term.startswith(query):
+                score = 3.0
+            elif f" {query}" in f" {term}":
+                score = 2.5
+            elif query in term:
+                score = 2.0
+            else:
+                # Dice similarity of the trigram sets
+                score = 2 * min(hits[value_id], len(query_grams)) / (len(query_grams) + entry['gram_counts'][value_id])
+                if score < SEARCH_MIN_SIMILARITY:
+                    continue
+            results.append((
+                col, SEARCH_COLUMNS[col], entry['values'][value_id],
+                int(entry['row_offsets'][value_id + 1] - entry['row_offsets'][value_id]),
+                round(score, 3), int(value_id), len(term)
+            ))
     
+    results = pd.DataFrame(results, columns=['COLUMN', 'KATEGORI', 'NILAI', 'JUMLAH', 'SKOR', 'VALUE_ID', 'LENGTH'])
+    results = results.sort_values(['SKOR', 'LENGTH', 'JUMLAH'], ascending=[False, True, False], kind='stable')
+    return results.drop(columns='LENGTH').head(top_k).reset_index(drop=True)
+
+# Function to get the rows of a search result
+def get_search_positions(search_index, col, value_id):
+    """Return the row positions holding one indexed value"""
+    entry = search_index[col]
+    return entry['row_order'][entry['row_offsets'][value_id]:entry['row_offsets'][value_id + 1]]
+
+# Interference analysis settings
+EARTH_RADIUS_KM = 6371.0088
+INTERFERENCE_MAX_PAIRS = 500000
+INTERFERENCE_CANDIDATE_CHUNK = 4000000  # candidate pairs checked per vectorized step
+INTERFERENCE_MAP_MAX_PAIRS = 2000
+INTERFERENCE_COLORS = {'Co-channel': 'red', 'Adjacent': 'orange'}
+# The own cell plus half of its neighbours, so every pair of cells is visited once
+GRID_NEIGHBOUR_OFFSETS = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) >= (0, 0, 0)]
+
+# Function to compute great-circle distances
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Return the haversine distance in km between coordinate arrays given in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+# Function to get the occupied frequency interval of every row
+def get_frequency_intervals(df):
+    """Return (lower, upper) edges of FREQ_MHZ +/- BW_MHZ/2, treating a missing bandwidth as 0"""
+    freqs = df['FREQ_MHZ'].to_numpy(dtype=np.float64)
+    if 'BW_MHZ' in df.columns:
+        half_bw = np.nan_to_num(df['BW_MHZ'].to_numpy(dtype=np.float64)) / 2
     else:
-        # Default to random sampling
-        return df.sample(max_markers, random_state=42)
+        half_bw = np.zeros(len(df))
+    return freqs - half_bw, freqs + half_bw
 
-# Initialize session state for storing uploaded data
-if 'data' not in st.session_state:
-    st.session_state.data = None
+# Function to find interfering station pairs
+def find_interference_pairs(df, max_distance_km, guard_mhz):
+    """Return (pairs, truncated) for stations within max_distance_km whose intervals overlap or lie within guard_mhz"""
+    lower, upper = get_frequency_intervals(df)
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon) | np.isnan(lower)))
+    lat, lon, lower, upper = lat[valid], lon[valid], lower[valid], upper[valid]
+    
+    empty = pd.DataFrame({
+        'POS_A': np.empty(0, dtype=np.int64), 'POS_B': np.empty(0, dtype=np.int64),
+        'DISTANCE_KM': np.empty(0), 'GAP_MHZ': np.empty(0), 'TYPE': np.empty(0, dtype=object)
+    })
+    if len(valid) < 2:
+        return empty, False
+    
+    # Spatial index: a 3D grid over unit-sphere coordinates with cells as wide as the distance
+    # limit; the chord is never longer than the arc, so every match is in a neighbouring cell
+    cell_km = max(float(max_distance_km), 0.1)
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    xyz = EARTH_RADIUS_KM * np.column_stack([
+        np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)
+    ])
+    offset = int(np.ceil(EARTH_RADIUS_KM / cell_km)) + 2
+    base = 2 * offset + 1
+    grid = np.floor(xyz / cell_km).astype(np.int64) + offset
+    cell_keys = (grid[:, 0] * base + grid[:, 1]) * base + grid[:, 2]
+    
+    # Sort by cell, then by lower edge, so one searchsorted finds a frequency window in any cell
+    order = np.lexsort((lower, cell_keys))
+    cell_keys, lower, upper = cell_keys[order], lower[order], upper[order]
+    lat, lon = lat[order], lon[order]
+    unique_cells, cell_ranks = np.unique(cell_keys, return_inverse=True)
+    
+    low_min = lower.min()
+    max_width = float((upper - lower).max())
+    span = float(upper.max() - low_min) + max_width + guard_mhz + 1.0
+    sort_keys = cell_ranks * span + (lower - low_min)
+    
+    found_a, found_b, found_dist, found_gap = [], [], [], []
+    total = 0
+    truncated = False
+    
+    for dx, dy, dz in GRID_NEIGHBOUR_OFFSETS:
+        neighbour = cell_keys + (dx * base + dy) * base + dz
+        ranks = np.searchsorted(unique_cells, neighbour)
+        hit = np.flatnonzero(unique_cells[np.minimum(ranks, len(unique_cells) - 1)] == neighbour)
+        if not len(hit):
+            continue
+        
+        # Frequency sweep window: every interval whose lower edge can still reach this one
+        window_base = ranks[hit] * span - low_min
+        starts = np.searchsorted(sort_keys, window_base + lower[hit] - guard_mhz - max_width, 'left')
+        stops = np.searchsorted(sort_keys, window_base + upper[hit] + guard_mhz, 'right')
+        if (dx, dy, dz) == (0, 0, 0):
+            # Within a cell, only look forward so each pair is found once
+            starts = np.maximum(starts, hit + 1)
+        counts = np.maximum(stops - starts, 0)
+        
+        # Expand candidates in bounded chunks
+        bounds = np.searchsorted(np.cumsum(counts), np.arange(INTERFERENCE_CANDIDATE_CHUNK, counts.sum(), INTERFERENCE_CANDIDATE_CHUNK))
+        for chunk in np.split(np.arange(len(hit)), np.unique(bounds)):
+            if not len(chunk) or not counts[chunk].sum():
+                continue
+            a = np.repeat(hit[chunk], counts[chunk])
+            b = np.repeat(starts[chunk] - np.cumsum(counts[chunk]) + counts[chunk], counts[chunk]) + np.arange(len(a))
+            
+            # Keep intervals that overlap or lie within the guard band
+            gap = np.maximum(lower[a], lower[b]) - np.minimum(upper[a], upper[b])
+            keep = gap <= guard_mhz
+            a, b, gap = a[keep], b[keep], gap[keep]
+            
+            dist = haversine_distance(lat[a], lon[a], lat[b], lon[b])
+            keep = dist <= max_distance_km
+            found_a.append(a[keep])
+            found_b.append(b[keep])
+            found_dist.append(dist[keep])
+            found_gap.append(np.maximum(gap[keep], 0))
+            
+            total += int(keep.sum())
+            if total >= INTERFERENCE_MAX_PAIRS:
+                truncated = True
+                break
+        if truncated:
+            break
+    
+    if not total:
+        return empty, False
+    
+    positions = valid[order]
+    gaps = np.concatenate(found_gap)
+    pairs = pd.DataFrame({
+        'POS_A': positions[np.concatenate(found_a)],
+        'POS_B': positions[np.concatenate(found_b)],
+        'DISTANCE_KM': np.concatenate(found_dist),
+        'GAP_MHZ': gaps,
+        'TYPE': np.where(gaps > 0, 'Adjacent', 'Co-channel')
+    })
+    pairs = pairs.sort_values(['GAP_MHZ', 'DISTANCE_KM'], kind='stable').head(INTERFERENCE_MAX_PAIRS).reset_index(drop=True)
+    return pairs, truncated
+
+# Function to get the cached interference pairs of a (filtered) dataset
+@st.cache_data(max_entries=8)
+def get_interference_pairs(dataset_id, filter_key, max_distance_km, guard_mhz, _df):
+    """Return (pairs, truncated) cached per dataset, filter, distance and guard band"""
+    return find_interference_pairs(_df, max_distance_km, guard_mhz)
+
+# Function to describe interference pairs with station details
+def get_interference_table(df, pairs):
+    """Return one readable row per interfering pair"""
+    table = pd.DataFrame(index=pairs.index)
+    for suffix, column in (('A', 'POS_A'), ('B', 'POS_B')):
+        stations = df.iloc[pairs[column].to_numpy()]
+        for field in ['STN_NAME', 'CLNT_NAME', 'SERVICE', 'CITY', 'FREQ_MHZ', 'BW_MHZ']:
+            if field in stations.columns:
+                table[f'{field}_{suffix}'] = stations[field].to_numpy()
+    table['TYPE'] = pairs['TYPE']
+    table['DISTANCE_KM'] = pairs['DISTANCE_KM'].round(3)
+    table['GAP_MHZ'] = pairs['GAP_MHZ'].round(4)
+    return table
+
+# Function to count stations involved in interference per category
+def get_interference_summary(df, pairs, column):
+    """Return per-value counts of conflicting station endpoints by interference type"""
+    positions = np.concatenate([pairs['POS_A'].to_numpy(), pairs['POS_B'].to_numpy()])
+    endpoints = pd.DataFrame({
+        column: df[column].iloc[positions].astype(str).to_numpy(),
+        'TYPE': np.tile(pairs['TYPE'].to_numpy(), 2)
+    })
+    summary = endpoints.groupby([column, 'TYPE']).size().unstack(fill_value=0)
+    summary['TOTAL'] = summary.sum(axis=1)
+    return summary.sort_values('TOTAL', ascending=False).reset_index()
+
+# Function to draw interference pairs on a map
+def build_interference_layer(df, pairs):
+    """Build a FeatureGroup with one line per pair for the closest conflicts"""
+    layer = folium.FeatureGroup(name="Interferensi")
+    shown = pairs.head(INTERFERENCE_MAP_MAX_PAIRS)
+    
+    lat = df['SID_LAT'].to_numpy()
+    lon = df['SID_LONG'].to_numpy()
+    names = df['STN_NAME'].astype(str).to_numpy()
+    for pos_a, pos_b, distance, gap, kind in shown[['POS_A', 'POS_B', 'DISTANCE_KM', 'GAP_MHZ', 'TYPE']].itertuples(index=False):
+        folium.PolyLine(
+            [[lat[pos_a], lon[pos_a]], [lat[pos_b], lon[pos_b]]],
+            color=INTERFERENCE_COLORS[kind],
+            weight=3,
+            opacity=0.8,
+            tooltip=f"{kind}: {names[pos_a]} - {names[pos_b]} ({distance:.2f} km, selisih {gap:.3f} MHz)"
+        ).add_to(layer)
+    
+    return layer
+
+# Spectrum occupancy: frequency range of each band, for occupancy percentages
+FREQ_BAND_RANGES = {
+    "HF (3-30 MHz)": (3, 30),
+    "VHF (30-300 MHz)": (30, 300),
+    "UHF (300-3000 MHz)": (300, 3000),
+    "SHF (3-30 GHz)": (3000, 30000),
+    "EHF (30-300 GHz)": (30000, 300000),
+    "THF (>300 GHz)": (300000, 3000000)
+}
+
+# Function to merge frequency intervals into their union
+def merge_intervals(lower, upper):
+    """Return sorted, disjoint (lower, upper) arrays covering the union of the given intervals"""
+    valid = ~(np.isnan(lower) | np.isnan(upper))
+    lower, upper = lower[valid], upper[valid]
+    if not len(lower):
+        return np.empty(0), np.empty(0)
+    
+    # Sweep by lower edge: a new segment starts where it begins after everything before it ended
+    order = np.argsort(lower, kind='stable')
+    lower, upper = lower[order], upper[order]
+    reach = np.maximum.accumulate(upper)
+    starts = np.flatnonzero(np.r_[True, lower[1:] > reach[:-1]])
+    ends = np.r_[starts[1:], len(lower)] - 1
+    return lower[starts], reach[ends]
 
-# Initialize session state for file uploader
-if 'uploaded_file' not in st.session_state:
-    st.session_state.uploaded_file = None
+# Function to get the positions of stations inside a region
+def get_region_positions(df, region):
+    """Return row positions for ('all',), ('city', name) or ('radius', city, radius_km)"""
+    if region[0] == 'all':
+        return np.arange(len(df))
+    
+    city_positions = np.flatnonzero((df['CITY'] == region[1]).to_numpy())
+    if region[0] == 'city':
+        return city_positions
+    
+    # Radius around the city's mean location, prefiltered with a bounding box
+    center_lat = df['SID_LAT'].iloc[city_positions].mean()
+    center_lon = df['SID_LONG'].iloc[city_positions].mean()
+    radius_km = region[2]
+    lat = df['SID_LAT'].to_numpy(dtype=np.float64)
+    lon = df['SID_LONG'].to_numpy(dtype=np.float64)
+    lat_margin = radius_km / 110.574
+    lon_margin = radius_km / (111.320 * max(np.cos(np.radians(center_lat)), 0.01))
+    candidates = np.flatnonzero((np.abs(lat - center_lat) <= lat_margin) & (np.abs(lon - center_lon) <= lon_margin))
+    distance = haversine_distance(lat[candidates], lon[candidates], center_lat, center_lon)
+    return candidates[distance <= radius_km]
+
+# Function to get the cached spectrum occupancy of a region
+@st.cache_data(max_entries=32)
+def get_region_occupancy(dataset_id, filter_key, region, _df):
+    """Return the merged occupied intervals, their cumulative lengths and the station count of a region"""
+    positions = get_region_positions(_df, region)
+    lower, upper = get_frequency_intervals(_df.iloc[positions])
+    union_lower, union_upper = merge_intervals(lower, upper)
+    return {
+        'lower': union_lower,
+        'upper': union_upper,
+        'cumulative': np.r_[0.0, np.cumsum(union_upper - union_lower)],
+        'stations': int(np.count_nonzero(~np.isnan(lower)))
+    }
+
+# Function to measure occupied spectrum below a frequency
+def get_covered_length(occupancy, freq):
+    """Return the occupied MHz below freq using the cumulative union lengths"""
+    count = np.searchsorted(occupancy['lower'], freq, 'right')
+    overshoot = np.maximum(occupancy['upper'][count - 1] - freq, 0) if count else 0.0
+    return occupancy['cumulative'][count] - overshoot
+
+# Function to measure occupied spectrum per frequency band
+def get_band_occupancy(occupancy):
+    """Return occupied MHz and percentage per frequency band"""
+    rows = []
+    for band, (low, high) in FREQ_BAND_RANGES.items():
+        occupied = get_covered_length(occupancy, high) - get_covered_length(occupancy, low)
+        rows.append({
+            'FREQ_BAND': band,
+            'OCCUPIED_MHZ': occupied,
+            'BAND_WIDTH_MHZ': high - low,
+            'OCCUPANCY_PCT': 100 * occupied / (high - low)
+        })
+    return pd.DataFrame(rows)
+
+# Function to find free spectrum blocks
+def find_free_gaps(occupancy, low, high, min_width):
+    """Return free (unoccupied) blocks of at least min_width MHz inside [low, high]"""
+    # Occupied segments that touch the range, clipped to it
+    first = np.searchsorted(occupancy['upper'], low, 'right')
+    last = np.searchsorted(occupancy['lower'], high, 'left')
+    seg_lower = np.clip(occupancy['lower'][first:last], low, high)
+    seg_upper = np.clip(occupancy['upper'][first:last], low, high)
+    
+    # Gaps lie between the end of one segment and the start of the next
+    gap_lower = np.r_[low, seg_upper]
+    gap_upper = np.r_[seg_lower, high]
+    widths = gap_upper - gap_lower
+    keep = widths >= min_width
+    return pd.DataFrame({
+        'START_MHZ': gap_lower[keep],
+        'END_MHZ': gap_upper[keep],
+        'WIDTH_MHZ': widths[keep]
+    })
+
+# Initialize session state for the uploaded data; the session keeps only the dataset's
+# content hash, and the frame itself lives once per process in the dataset registry
+if 'data_id' not in st.session_state:
+    st.session_state.data_id = None
+
+# Initialize session state for file uploader (only the id of the last processed file, not its bytes)
+if 'uploaded_file_id' not in st.session_state:
+    st.session_state.uploaded_file_id = None
 if 'upload_status' not in st.session_state:
     st.session_state.upload_status = None
 if 'upload_message' not in st.session_state:
     st.session_state.upload_message = ""
 if 'upload_warnings' not in st.session_state:
     st.session_state.upload_warnings = []
+if 'quarantine' not in st.session_state:
+    st.session_state.quarantine = None
+
+# Dataset registry limits (shared by all sessions of this server process)
+DATASET_REGISTRY_MAX_ENTRIES = 8
+DATASET_REGISTRY_MAX_BYTES = 2 * 1024 ** 3  # 2 GB of parsed frames, the global memory budget
+
+# Session memory management
+SESSION_IDLE_TIMEOUT = 30 * 60  # seconds without a rerun before a dataset is spilled to disk
+SESSION_SWEEP_INTERVAL = 60  # seconds between idle checks
+
+# Function to get the process-wide dataset registry
+@st.cache_resource
+def get_dataset_registry():
+    """Return the shared registry of validated frames keyed by file content hash"""
+    return {'entries': OrderedDict(), 'total_bytes': 0, 'lock': threading.Lock()}
+
+# Function to get the id of the current browser session
+def get_session_id():
+    """Return the Streamlit session id, or None outside a script run"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+# Function to check whether a browser session is still connected
+def is_session_active(session_id):
+    """Return True if the session is still known to the Streamlit runtime"""
+    return runtime.exists() and runtime.get_instance().is_active_session(session_id)
+
+# Function to hash uploaded file contents
+def get_file_hash(uploaded_file):
+    """Return a hex digest of the uploaded file bytes"""
+    # getbuffer() exposes the bytes without copying them
+    return hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+
+# Function to look up a registered dataset
+def get_registered_dataset(file_hash):
+    """Return the registered (dataframe, warnings) for a file hash, or None"""
+    registry = get_dataset_registry()
+    with registry['lock']:
+        entry = registry['entries'].get(file_hash)
+        if entry is None:
+            return None
+        
+        # Mark as most recently used
+        registry['entries'].move_to_end(file_hash)
+        entry['last_access'] = time.time()
+        return entry['data'], entry['warnings']
+
+# Function to add a dataset to the registry
+def register_dataset(file_hash, df, warnings, name=None):
+    """Store a validated dataframe once per process and enforce the memory budget"""
+    size = int(df.memory_usage(deep=True).sum())
+    
+    registry = get_dataset_registry()
+    with registry['lock']:
+        entry = registry['entries'].pop(file_hash, None)
+        if entry is not None:
+            registry['total_bytes'] -= entry['bytes']
+        
+        registry['entries'][file_hash] = {
+            'data': df,
+            'warnings': warnings,
+            'name': name or (entry['name'] if entry is not None else file_hash),
+            'bytes': size,
+            'last_access': time.time(),
+            'sessions': entry['sessions'] if entry is not None else {},
+            'spilling': False
+        }
+        registry['total_bytes'] += size
+        spills = pick_datasets_to_spill(registry, keep=file_hash)
+    spill_datasets(registry, spills)
+
+# Function to move datasets out of memory
+def spill_datasets(registry, spills):
+    """Write picked datasets to the local store, then drop them from memory; call without holding the lock"""
+    # The Parquet writes run outside the lock, so other sessions' lookups are not blocked meanwhile
+    saved = []
+    for file_hash, entry in spills:
+        try:
+            save_dataset(file_hash, entry['data'], entry['name'], entry['warnings'])
+            saved.append(True)
+        except Exception:
+            saved.append(False)
+    
+    with registry['lock']:
+        for (file_hash, entry), is_saved in zip(spills, saved):
+            entry['spilling'] = False
+            
+            # A dataset registered again while it was being written keeps its new entry
+            if registry['entries'].get(file_hash) is not entry:
+                continue
+            # Without a columnar copy a dataset that sessions still use cannot be reloaded
+            if not is_saved and entry['sessions']:
+                continue
+            
+            registry['entries'].pop(file_hash)
+            registry['total_bytes'] -= entry['bytes']
+
+# Function to pick the datasets that must leave memory for the registry to fit its limits
+def pick_datasets_to_spill(registry, keep=None):
+    """Mark least recently used datasets for spilling, unused ones first, and return them as (file hash, entry) pairs"""
+    # Called with the lock held; sessions that closed without switching datasets no longer count as references
+    for entry in registry['entries'].values():
+        entry['sessions'] = {
+            session_id: last_seen for session_id, last_seen in entry['sessions'].items()
+            if is_session_active(session_id)
+        }
+    
+    # Datasets already being written elsewhere are about to leave memory
+    remaining = [entry for entry in registry['entries'].values() if not entry['spilling']]
+    count = len(remaining)
+    total_bytes = sum(entry['bytes'] for entry in remaining)
+    
+    # Datasets still open in a session are spilled only when unused ones are not enough;
+    # they are reloaded from the local store on the session's next rerun
+    spills = []
+    for in_use in (False, True):
+        for file_hash, entry in registry['entries'].items():
+            if count <= DATASET_REGISTRY_MAX_ENTRIES and total_bytes <= DATASET_REGISTRY_MAX_BYTES:
+                return spills
+            if file_hash != keep and not entry['spilling'] and bool(entry['sessions']) == in_use:
+                entry['spilling'] = True
+                spills.append((file_hash, entry))
+                count -= 1
+                total_bytes -= entry['bytes']
+    return spills
+
+# Function to spill datasets nobody has used for a while
+def spill_idle_datasets(registry, timeout=SESSION_IDLE_TIMEOUT):
+    """Spill every dataset whose last access is older than timeout seconds"""
+    idle_before = time.time() - timeout
+    with registry['lock']:
+        spills = []
+        for file_hash, entry in registry['entries'].items():
+            if entry['last_access'] < idle_before and not entry['spilling']:
+                entry['spilling'] = True
+                spills.append((file_hash, entry))
+    spill_datasets(registry, spills)
+
+# Function to start the background idle-session sweeper once per process
+@st.cache_resource
+def start_memory_manager(_registry):
+    """Start a daemon thread that spills idle datasets every SESSION_SWEEP_INTERVAL seconds"""
+    def sweep():
+        while True:
+            time.sleep(SESSION_SWEEP_INTERVAL)
+            spill_idle_datasets(_registry)
+    
+    thread = threading.Thread(target=sweep, name="dataset-memory-manager", daemon=True)
+    thread.start()
+    return thread
+
+# Function to take a reference to a registered dataset for the current session
+def acquire_dataset(file_hash):
+    """Return the registered (dataframe, warnings) and count the current session as a user, or None"""
+    session_id = get_session_id()
+    registry = get_dataset_registry()
+    with registry['lock']:
+        entry = registry['entries'].get(file_hash)
+        if entry is None:
+            return None
+        
+        # A session holds one dataset at a time
+        now = time.time()
+        if session_id is not None:
+            if session_id not in entry['sessions']:
+                for other in registry['entries'].values():
+                    other['sessions'].pop(session_id, None)
+            entry['sessions'][session_id] = now
+        
+        registry['entries'].move_to_end(file_hash)
+        entry['last_access'] = now
+        return entry['data'], entry['warnings']
+
+# Function to get the memory held for the current session
+def get_session_footprint():
+    """Return (bytes of the dataset held by this session, bytes of all registered datasets)"""
+    session_id = get_session_id()
+    registry = get_dataset_registry()
+    with registry['lock']:
+        session_bytes = sum(entry['bytes'] for entry in registry['entries'].values() if session_id in entry['sessions'])
+        return session_bytes, registry['total_bytes']
+
+# Function to get the current session's dataset
+def get_session_data():
+    """Return the shared dataframe behind the session's data_id, reloading it from the local store if needed"""
+    if st.session_state.data_id is None:
+        return None
+    
+    # Every session gets the same frame; pandas copy-on-write keeps it read-only for all of them
+    known = acquire_dataset(st.session_state.data_id)
+    if known is None and get_known_dataset(st.session_state.data_id) is not None:
+        known = acquire_dataset(st.session_state.data_id)
+    return known[0] if known is not None else None
+
+start_memory_manager(get_dataset_registry())
+
+# Chunk sizes for streaming CSV ingest
+CSV_CHUNK_ROWS = 200000
+CSV_BLOCK_BYTES = 16 * 1024 ** 2  # 16 MB per pyarrow block
+
+# Function to read an uploaded CSV file in typed chunks
+def read_csv_chunks(uploaded_file):
+    """Yield the CSV as dataframe chunks, using the pyarrow parser when it is installed"""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        # Fall back to the pandas parser with the same dtype schema
+        dtypes = {col: 'str' if col in NUMERIC_COLUMNS else dtype for col, dtype in COLUMN_DTYPES.items()}
+        yield from pd.read_csv(uploaded_file, dtype=dtypes, chunksize=CSV_CHUNK_ROWS)
+        return
+    
+    # Read the header first so every column gets a fixed type for all blocks;
+    # numeric columns stay text here and are parsed in get_row_errors
+    columns = pd.read_csv(uploaded_file, nrows=0).columns
+    uploaded_file.seek(0)
+    column_types = {col: pa.string() for col in columns}
+    
+    reader = pa_csv.open_csv(
+        uploaded_file,
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+# Function to downcast a chunk to the column dtype schema
+def optimize_dtypes(df):
+    """Convert known columns to their compact dtypes from COLUMN_DTYPES"""
+    # Text columns keep the parser's string dtype so missing values stay missing
+    dtypes = {col: dtype for col, dtype in COLUMN_DTYPES.items() if col in df.columns and dtype != 'str'}
+    return df.astype(dtypes, copy=False)
+
+# Function to combine parsed chunks into one dataframe
+def concat_chunks(chunks):
+    """Concatenate chunks, merging per-chunk categories instead of falling back to object; the chunks are emptied"""
+    if len(chunks) == 1:
+        return chunks[0]
+    
+    # Columns are combined one at a time and taken out of the chunks, so each column's
+    # parts are freed as soon as it is built and peak memory stays near the final frame
+    df = pd.DataFrame(index=pd.RangeIndex(sum(len(chunk) for chunk in chunks)))
+    for col in list(chunks[0].columns):
+        parts = [chunk.pop(col) for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            # A chunk where the column is empty has categories of another dtype
+            parts = [part.cat.set_categories(part.cat.categories.astype(str)) for part in parts]
+            df[col] = pd.api.types.union_categoricals(parts)
+        else:
+            df[col] = pd.concat(parts, ignore_index=True)
+        del parts
+    return df
+
+# Export formats: label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "GeoJSON": ("geojson", "application/geo+json"),
+    "KML": ("kml", "application/vnd.google-earth.kml+xml")
+}
+EXPORT_CHUNK_ROWS = 50000
+# st.download_button holds the whole file in memory once clicked, so exports are capped and sized up front
+EXPORT_MAX_ROWS = 1000000
+EXPORT_WARN_BYTES = 200 * 1024 ** 2
+EXPORT_SAMPLE_ROWS = 1000
+
+# Function to escape text for XML element content
+def escape_xml(values):
+    """Return a string Series with &, < and > escaped, and missing values as empty strings"""
+    return (values.astype(str).where(values.notna(), "")
+            .str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False))
+
+# Function to format point coordinates of a chunk
+def get_coordinate_text(chunk):
+    """Return "lon,lat" per row, or None where a coordinate is missing"""
+    lat = chunk['SID_LAT'].astype('float64')
+    lon = chunk['SID_LONG'].astype('float64')
+    text = lon.map(repr) + "," + lat.map(repr)
+    return text.where(lat.notna() & lon.notna(), None)
+
+# Function to serialize one chunk of GeoJSON features
+def get_geojson_features(chunk):
+    """Return the chunk as comma-separated GeoJSON Point features"""
+    coordinates = get_coordinate_text(chunk)
+    geometry = ('{"type":"Point","coordinates":[' + coordinates + ']}').fillna("null")
+    properties = chunk.drop(columns=['SID_LAT', 'SID_LONG']).to_json(orient='records', lines=True).splitlines()
+    features = '{"type":"Feature","geometry":' + geometry + ',"properties":' + pd.Series(properties, index=chunk.index) + '}'
+    return ",\n".join(features)
+
+# Function to serialize one chunk of KML placemarks
+def get_kml_placemarks(chunk):
+    """Return the chunk as KML Placemarks with all columns as ExtendedData"""
+    placemarks = "<Placemark><name>" + escape_xml(chunk['STN_NAME']) + "</name><ExtendedData>"
+    for col in chunk.columns:
+        placemarks += f'<Data name="{col}"><value>' + escape_xml(chunk[col]) + "</value></Data>"
+    placemarks += "</ExtendedData>"
+    
+    coordinates = get_coordinate_text(chunk)
+    points = ("<Point><coordinates>" + coordinates + "</coordinates></Point>").fillna("")
+    return "\n".join(placemarks + points + "</Placemark>") + "\n"
+
+# Function to write a dataframe to an export file chunk by chunk
+def write_export(df, export_format, f):
+    """Write df to the binary file f in the given format, serializing EXPORT_CHUNK_ROWS rows at a time"""
+    chunks = (df.iloc[start:start + EXPORT_CHUNK_ROWS] for start in range(0, len(df), EXPORT_CHUNK_ROWS))
+    
+    if export_format == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        # The first chunk fixes the schema so columns that are empty in later chunks keep their types
+        schema = pa.Schema.from_pandas(df.iloc[:EXPORT_CHUNK_ROWS], preserve_index=False)
+        with pq.ParquetWriter(f, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    
+    elif export_format == "GeoJSON":
+        f.write(b'{"type":"FeatureCollection","features":[\n')
+        for i, chunk in enumerate(chunks):
+            f.write(((",\n" if i else "") + get_geojson_features(chunk)).encode())
+        f.write(b'\n]}\n')
+    
+    elif export_format == "KML":
+        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+        for chunk in chunks:
+            f.write(get_kml_placemarks(chunk).encode())
+        f.write(b'</Document></kml>\n')
+    
+    else:
+        f.write(df.iloc[:0].to_csv(index=False).encode())
+        for chunk in chunks:
+            f.write(chunk.to_csv(index=False, header=False).encode())
+
+# Function to estimate the size of an export file without writing it
+@st.cache_data(max_entries=32)
+def get_export_size_estimate(dataset_id, filter_key, export_format, _df):
+    """Return the estimated export size in bytes, extrapolated from an evenly spaced sample of rows"""
+    if len(_df) == 0:
+        return 0
+    sample = _df.iloc[np.linspace(0, len(_df) - 1, min(len(_df), EXPORT_SAMPLE_ROWS)).astype(np.intp)]
+    buffer = io.BytesIO()
+    write_export(sample, export_format, buffer)
+    return int(buffer.tell() / len(sample) * len(_df))
+
+# Function to generate an export file when the download is requested
+def get_export_file(df, export_format):
+    """Return a temporary file holding the export, positioned at its start"""
+    # Chunks are spooled to disk, so only one serialized chunk is in memory at a time
+    f = tempfile.TemporaryFile()
+    write_export(df, export_format, f)
+    f.seek(0)
+    return f
+
+# Default key identifying an assignment when merging a delta file
+MERGE_KEY_COLUMNS = ['STN_NAME', 'CLNT_NAME', 'FREQ_MHZ']
+
+# Function to hash the key columns of every row
+def get_row_keys(df, key_columns):
+    """Return a uint64 hash per row of the key column values"""
+    # Categorical columns hash their values, not their codes, so keys compare across datasets
+    return pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+
+# Function to give a delta file the columns and dtypes of the dataset it is merged into
+def align_delta_columns(delta, base):
+    """Return the delta with exactly the base columns, plus the names of delta columns that were dropped"""
+    extra = [col for col in delta.columns if col not in base.columns]
+    columns = {
+        col: delta[col] if col in delta.columns else pd.Series(index=delta.index, dtype=base[col].dtype)
+        for col in base.columns
+    }
+    return pd.DataFrame(columns, index=delta.index), extra
+
+# Function to upsert delta rows into a dataset by key
+def merge_datasets(base, delta, key_columns):
+    """Return (merged dataframe, new position per base row or -1 if replaced, deduplicated delta, count of delta keys new to the base)"""
+    # Within the delta the last row of a key wins
+    delta_keys = get_row_keys(delta, key_columns)
+    _, last = np.unique(delta_keys[::-1], return_index=True)
+    keep_delta = np.sort(len(delta) - 1 - last)
+    delta = delta.iloc[keep_delta].reset_index(drop=True)
+    delta_keys = delta_keys[keep_delta]
+    
+    # Base rows whose key appears in the delta are replaced; the rest keep their order.
+    # Only rows with every key value present in the delta can match, so only those are hashed
+    candidates = np.ones(len(base), dtype=bool)
+    for col in key_columns:
+        candidates &= base[col].isin(delta[col].unique()).to_numpy()
+    candidates = np.flatnonzero(candidates)
+    candidate_keys = get_row_keys(base.iloc[candidates], key_columns)
+    replaced = np.zeros(len(base), dtype=bool)
+    replaced[candidates] = np.isin(candidate_keys, delta_keys)
+    added = int(np.count_nonzero(~np.isin(delta_keys, candidate_keys)))
+    new_positions = np.full(len(base), -1, dtype=np.intp)
+    new_positions[~replaced] = np.arange(len(base) - replaced.sum())
+    
+    kept = base if not replaced.any() else base.iloc[np.flatnonzero(~replaced)]
+    # concat_chunks takes the columns out of its inputs, so it gets a shallow copy of the delta
+    merged = concat_chunks([kept.reset_index(drop=True), delta.copy(deep=False)])
+    return merged, new_positions, delta, added
+
+# Local store for validated datasets (one Parquet file per content hash)
+DATASET_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets")
+
+# Function to save a validated dataset to the local store
+def save_dataset(file_hash, df, name, warnings):
+    """Write a validated dataframe to Parquet once, with a small JSON metadata file"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    data_path = os.path.join(DATASET_STORE_DIR, f"{file_hash}.parquet")
+    if os.path.exists(data_path):
+        return
+    
+    os.makedirs(DATASET_STORE_DIR, exist_ok=True)
+    
+    # Write to a temporary file first so readers never see a partial dataset
+    temp_path = data_path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_path)
+    os.replace(temp_path, data_path)
+    
+    metadata = {
+        'hash': file_hash,
+        'name': name,
+        'rows': len(df),
+        'columns': df.columns.tolist(),
+        'warnings': warnings,
+        'saved_at': datetime.now().isoformat(timespec='seconds')
+    }
+    with open(os.path.join(DATASET_STORE_DIR, f"{file_hash}.json"), "w") as f:
+        json.dump(metadata, f)
+
+# Function to list datasets in the local store
+def list_stored_datasets():
+    """Return metadata of stored datasets, newest first"""
+    if not os.path.isdir(DATASET_STORE_DIR):
+        return []
+    
+    datasets = []
+    for file_name in os.listdir(DATASET_STORE_DIR):
+        if not file_name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(DATASET_STORE_DIR, file_name)) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.exists(os.path.join(DATASET_STORE_DIR, f"{metadata['hash']}.parquet")):
+            datasets.append(metadata)
+    
+    return sorted(datasets, key=lambda metadata: metadata['saved_at'], reverse=True)
+
+# Function to read a dataset from the local store
+def load_stored_dataset(file_hash):
+    """Read a stored dataset memory-mapped, projecting only the columns the app uses"""
+    import pyarrow.parquet as pq
+    
+    data_path = os.path.join(DATASET_STORE_DIR, f"{file_hash}.parquet")
+    schema = pq.read_schema(data_path)
+    columns = [col for col in schema.names if col in REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
+    
+    table = pq.read_table(data_path, columns=columns, memory_map=True)
+    return add_derived_columns(table.to_pandas())
+
+# Function to remove a dataset from the local store
+def delete_stored_dataset(file_hash):
+    """Delete a stored dataset and its metadata"""
+    for extension in (".parquet", ".json"):
+        path = os.path.join(DATASET_STORE_DIR, f"{file_hash}{extension}")
+        if os.path.exists(path):
+            os.remove(path)
+
+# Function to get a dataset by content hash from memory or the local store
+def get_known_dataset(file_hash):
+    """Return (dataframe, warnings) from the dataset registry or the local store, or None"""
+    registered = get_registered_dataset(file_hash)
+    if registered is not None:
+        return registered
+    
+    for metadata in list_stored_datasets():
+        if metadata['hash'] == file_hash:
+            df = load_stored_dataset(file_hash)
+            register_dataset(file_hash, df, metadata['warnings'], metadata['name'])
+            return df, metadata['warnings']
+    return None
+
+# Function to load a stored dataset into the session
+def process_stored_dataset(file_hash):
+    st.session_state.quarantine = None
+    try:
+        known = get_known_dataset(file_hash)
+        if known is None:
+            st.session_state.upload_message = "Dataset tersimpan tidak ditemukan."
+            st.session_state.upload_status = "error"
+            st.session_state.upload_warnings = []
+            return False
+        
+        st.session_state.upload_warnings = known[1]
+        st.session_state.data_id = file_hash
+        acquire_dataset(file_hash)
+        st.session_state.upload_message = "Dataset berhasil dimuat dari penyimpanan lokal!"
+        st.session_state.upload_status = "success"
+        return True
+    
+    except Exception as e:
+        st.session_state.upload_message = f"Error memuat dataset: {str(e)}"
+        st.session_state.upload_status = "error"
+        st.session_state.upload_warnings = []
+        return False
+
+# Function to read and validate an uploaded CSV chunk by chunk
+def read_validated_csv(uploaded_file):
+    """Return (is_valid, error message or warnings, dataframe or None, quarantine report or None), showing parse progress"""
+    total_bytes = max(uploaded_file.getbuffer().nbytes, 1)
+    progress = st.progress(0.0, text="Membaca file...")
+    start_time = time.perf_counter()
+    chunks = []
+    quarantined = []
+    rule_counts = np.zeros(len(RULE_DESCRIPTIONS), dtype=np.int64)
+    row_count = 0
+    is_valid, message = False, "File tidak berisi data."
+    
+    for chunk in read_csv_chunks(uploaded_file):
+        is_valid, chunk_message = validate_csv_data(chunk)
+        if not is_valid:
+            message = chunk_message
+            break
+        
+        # Optional column warnings are the same for every chunk
+        if not chunks:
+            message = chunk_message
+        
+        # Rows failing any rule are set aside as read, with their file line number and reasons
+        parsed, errors = get_row_errors(chunk)
+        bad = errors != 0
+        if bad.any():
+            bad_rows = chunk[bad].copy()
+            bad_rows.insert(0, 'BARIS', row_count + np.flatnonzero(bad) + 2)
+            bad_rows['ALASAN_KARANTINA'] = describe_row_errors(errors[bad])
+            quarantined.append(bad_rows)
+            rule_counts += count_rule_errors(errors)
+            parsed = parsed[~bad]
+        chunks.append(optimize_dtypes(parsed))
+        
+        row_count += len(errors)
+        rows_per_second = row_count / max(time.perf_counter() - start_time, 1e-6)
+        progress.progress(
+            min(uploaded_file.tell() / total_bytes, 1.0),
+            text=f"Memproses {row_count:,} baris ({rows_per_second:,.0f} baris/detik)"
+        )
+    
+    progress.empty()
+    if not is_valid:
+        return False, message, None, None
+    
+    quarantine = None
+    if quarantined:
+        quarantine = {
+            'rows': pd.concat(quarantined, ignore_index=True),
+            'rule_counts': pd.Series(rule_counts, index=RULE_DESCRIPTIONS)
+        }
+        if sum(len(chunk) for chunk in chunks) == 0:
+            return False, "Semua baris gagal validasi. Unduh tabel karantina untuk melihat alasannya.", None, quarantine
+        message = message + [f"{len(quarantine['rows']):,} baris gagal validasi dan dikarantina."]
+    return True, message, concat_chunks(chunks), quarantine
 
 # Function to process uploaded CSV file
 def process_uploaded_file(uploaded_file):
     try:
-        # Read CSV into pandas DataFrame
-        df = pd.read_csv(uploaded_file)
+        # Reuse the validated frame if this exact file was ingested or stored before
+        file_hash = get_file_hash(uploaded_file)
+        known = get_known_dataset(file_hash)
+        if known is not None:
+            st.session_state.upload_warnings = known[1]
+            st.session_state.quarantine = None
+            st.session_state.data_id = file_hash
+            acquire_dataset(file_hash)
+            st.session_state.upload_message = "Data berhasil diunggah!"
+            st.session_state.upload_status = "success"
+            return True
         
-        # Validate the data
-        is_valid, message = validate_csv_data(df)
+        # Read, validate and downcast the CSV chunk by chunk; invalid rows are quarantined
+        is_valid, message, df, st.session_state.quarantine = read_validated_csv(uploaded_file)
         
         if is_valid:
             # If it's a list of warnings (valid=True), store warnings
@@ -367,8 +2323,19 @@ def process_uploaded_file(uploaded_file):
                 st.session_state.upload_status = "success"
                 st.session_state.upload_warnings = []
                 
-            # Store the data in session state
-            st.session_state.data = df
+            # Compute derived columns once at ingest, then share the frame through the registry
+            df = add_derived_columns(df)
+            register_dataset(file_hash, df, st.session_state.upload_warnings, uploaded_file.name)
+            st.session_state.data_id = file_hash
+            acquire_dataset(file_hash)
+            
+            # Keep a columnar copy so the dataset can be reopened without re-uploading
+            try:
+                save_dataset(file_hash, df, uploaded_file.name, st.session_state.upload_warnings)
+            except Exception as e:
+                st.session_state.upload_warnings = st.session_state.upload_warnings + [
+                    f"Dataset tidak dapat disimpan ke penyimpanan lokal: {str(e)}"
+                ]
             return True
         else:
             # If not valid, set error message
@@ -384,6 +2351,435 @@ def process_uploaded_file(uploaded_file):
         st.session_state.upload_warnings = []
         return False
 
+# Function to merge an uploaded delta CSV file into the session's dataset
+def process_merge_file(uploaded_file, key_columns):
+    try:
+        base_id = st.session_state.data_id
+        base = get_session_data()
+        if base is None:
+            st.session_state.upload_message = "Belum ada data untuk digabungkan. Unggah data lengkap terlebih dahulu."
+            st.session_state.upload_status = "error"
+            st.session_state.upload_warnings = []
+            return False
+        
+        # Only the delta is read and validated
+        is_valid, message, delta, st.session_state.quarantine = read_validated_csv(uploaded_file)
+        if not is_valid:
+            st.session_state.upload_message = message
+            st.session_state.upload_status = "error"
+            st.session_state.upload_warnings = []
+            return False
+        
+        missing_keys = [col for col in key_columns if col not in delta.columns]
+        if not key_columns or missing_keys:
+            st.session_state.upload_message = f"Kolom kunci tidak ditemukan pada file: {', '.join(missing_keys) or '-'}"
+            st.session_state.upload_status = "error"
+            st.session_state.upload_warnings = []
+            return False
+        
+        delta, extra_columns = align_delta_columns(add_derived_columns(delta), base)
+        merged, new_positions, delta, added = merge_datasets(base, delta, key_columns)
+        
+        warnings = message if isinstance(message, list) else []
+        if extra_columns:
+            warnings = warnings + [f"Kolom yang tidak ada pada data saat ini diabaikan: {', '.join(extra_columns)}"]
+        
+        # The merged dataset is identified by its inputs, so the same merge maps to the same caches
+        merge_key = f"{base_id}:{get_file_hash(uploaded_file)}:{','.join(key_columns)}"
+        merged_id = hashlib.blake2b(merge_key.encode(), digest_size=16).hexdigest()
+        register_dataset(merged_id, merged, warnings, f"{uploaded_file.name} (gabungan)")
+        st.session_state.data_id = merged_id
+        acquire_dataset(merged_id)
+        
+        # Keep a columnar copy so the merged dataset can be reopened without merging again
+        try:
+            save_dataset(merged_id, merged, f"{uploaded_file.name} (gabungan)", warnings)
+        except Exception as e:
+            warnings = warnings + [f"Dataset tidak dapat disimpan ke penyimpanan lokal: {str(e)}"]
+        
+        # Seed the merged dataset's indexes and aggregates from the base ones instead of rebuilding them
+        # Delta rows follow the kept base rows in the merged dataset
+        merge = {'base_id': base_id, 'base': base, 'delta': delta, 'new_positions': new_positions, 'offset': len(merged) - len(delta)}
+        get_filter_index(merged_id, merged, _merge=merge)
+        if 'FREQ_MHZ' in merged.columns:
+            get_frequency_index(merged_id, merged, _merge=merge)
+        get_aggregate_cube(merged_id, None, merged, _merge=merge)
+        
+        st.session_state.upload_message = (
+            f"Data berhasil digabungkan: {added:,} baris baru, {len(delta) - added:,} baris diperbarui "
+            f"(total {len(merged):,} baris)."
+        )
+        st.session_state.upload_status = "success"
+        st.session_state.upload_warnings = warnings
+        return True
+    
+    except Exception as e:
+        st.session_state.upload_message = f"Error menggabungkan file: {str(e)}"
+        st.session_state.upload_status = "error"
+        st.session_state.upload_warnings = []
+        return False
+
+# Function to show the analysis map as an isolated partial-rerun region
+@st.fragment
+def show_analysis_map(df, filtered_df, filter_key, has_freq, max_markers, sampling_method, lazy_popups, heatmap_weight=None):
+    """Show the analysis map section; its widgets rerun only this fragment"""
+    st.markdown("### 🗺️ Peta Sebaran Lokasi Frekuensi")
+    
+    # Map settings
+    map_col1, map_col2 = st.columns(2)
+    
+    with map_col1:
+        # Map type selection
+        map_types = ["OpenStreetMap", "Esri Satellite", "CartoDB Dark", "Stamen Terrain"]
+        map_type = st.selectbox(
+            "Pilih Jenis Peta:",
+            map_types,
+            index=get_saved_index("analysis_map_type", map_types),
+            key="analysis_map_type",
+            on_change=save_setting,
+            args=("analysis_map_type",)
+        )
+    
+    with map_col2:
+        # Display mode
+        display_modes = ["Markers", "Heatmap", "Markers + Heatmap", VIEWPORT_DISPLAY_MODE]
+        display_mode = st.selectbox(
+            "Mode Tampilan:",
+            display_modes,
+            index=get_saved_index("analysis_display_mode", display_modes),
+            key="analysis_display_mode",
+            on_change=save_setting,
+            args=("analysis_display_mode",)
+        )
+    
+    # Conflict layer uses the settings of the interference tab
+    show_interference = has_freq and st.checkbox(
+        "Tampilkan konflik interferensi pada peta",
+        value=get_saved_setting("show_interference", False),
+        help="Garis merah: co-channel, garis oranye: kanal bersebelahan. Pengaturan jarak dan guard band ada di tab Analisis Interferensi.",
+        key="show_interference",
+        on_change=save_setting,
+        args=("show_interference",)
+    )
+    
+    # Create map
+    if len(filtered_df) > 0:
+        # Optimize data if needed based on performance settings
+        if display_mode == VIEWPORT_DISPLAY_MODE:
+            # Viewport mode loads only visible tiles, so nothing is sampled
+            map_data = filtered_df
+        elif len(filtered_df) > max_markers:
+            map_data = filtered_df.iloc[get_map_sample(st.session_state.data_id, filter_key, max_markers, sampling_method, filtered_df)]
+            st.warning(f"Dataset terfilter terlalu besar ({len(filtered_df):,} baris). Menampilkan sampel {len(map_data):,} titik untuk performa yang lebih baik.")
+        else:
+            map_data = filtered_df
+        
+        # Tambahkan ini sebagai pengganti plugin Search
+        search_query = st.text_input(
+            "Cari lokasi:",
+            get_saved_setting("map_search", ""),
+            help="Cari kota, nama stasiun atau klien; ejaan tidak harus persis",
+            key="map_search",
+            on_change=save_setting,
+            args=("map_search",)
+        )
+        search_focus = None
+        focus_label = "-"
+        if search_query:
+            st.write(f"Mencari: {search_query}")
+            # Tampilkan hasil dari indeks pencarian
+            with st.spinner("Menyiapkan indeks pencarian..."):
+                search_index = get_search_index(st.session_state.data_id, df)
+            search_results = search_text_index(search_index, search_query)
+            if not search_results.empty:
+                st.dataframe(search_results[['KATEGORI', 'NILAI', 'JUMLAH', 'SKOR']], use_container_width=True)
+                
+                result_labels = [f"{row.KATEGORI}: {row.NILAI}" for row in search_results.itertuples()]
+                focus_label = st.selectbox(
+                    "Perbesar peta ke hasil:",
+                    ["-"] + result_labels,
+                    index=get_saved_index("map_search_focus", ["-"] + result_labels),
+                    key="map_search_focus",
+                    on_change=save_setting,
+                    args=("map_search_focus",)
+                )
+                if focus_label != "-":
+                    focus_result = search_results.iloc[result_labels.index(focus_label)]
+                    search_focus = df.iloc[get_search_positions(search_index, focus_result['COLUMN'], focus_result['VALUE_ID'])]
+                    st.dataframe(search_focus.head(1000), use_container_width=True)
+            else:
+                st.info("Tidak ditemukan hasil yang cocok")
+        
+        # Build the folium map; only called when its rendered HTML is not cached yet
+        def build_map():
+            """Build the analysis map with plugins, layers and legend"""
+            # Define map center (average of coordinates)
+            avg_lat = map_data['SID_LAT'].mean()
+            avg_long = map_data['SID_LONG'].mean()
+            
+            # Create base map
+            if map_type == "OpenStreetMap":
+                m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="OpenStreetMap")
+            elif map_type == "Esri Satellite":
+                m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="Esri Satellite")
+            elif map_type == "CartoDB Dark":
+                m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="CartoDB dark_matter")
+            elif map_type == "Stamen Terrain":
+                m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="Stamen Terrain")
+            
+            # Add plugins
+            MiniMap().add_to(m)
+            Draw(export=True).add_to(m)
+            LocateControl().add_to(m)
+            Fullscreen().add_to(m)
+            MousePosition().add_to(m)
+            
+            # Add search plugin
+            # Search(
+            #    layer=None,
+            #    geom_type="Point",
+            #    placeholder="Search location...",
+            #    collapsed=True,
+            #    search_zoom=12
+            # ).add_to(m)
+            
+            # Zoom to the selected search result
+            if search_focus is not None:
+                m.fit_bounds(
+                    [[search_focus['SID_LAT'].min(), search_focus['SID_LONG'].min()],
+                     [search_focus['SID_LAT'].max(), search_focus['SID_LONG'].max()]],
+                    max_zoom=15
+                )
+            
+            # Create marker cluster for markers
+            if display_mode in ["Markers", "Markers + Heatmap"]:
+                # Add all markers as one client-side layer
+                build_marker_layer(map_data, lazy_popups).add_to(m)
+            
+            # Add heatmap over the full filtered data, aggregated to a grid for the visible zoom
+            if display_mode in ["Heatmap", "Markers + Heatmap"]:
+                heat_zoom = 12 if search_focus is not None else 6
+                heat_grid = get_heatmap_grid(st.session_state.data_id, filter_key, heat_zoom, heatmap_weight, filtered_df)
+                build_heatmap_layer(heat_grid).add_to(m)
+            
+            # Add interference conflict lines
+            if show_interference:
+                interference_pairs, _ = get_interference_pairs(
+                    st.session_state.data_id,
+                    filter_key,
+                    get_saved_setting("interference_distance", 10),
+                    get_saved_setting("interference_guard", 0.2),
+                    filtered_df
+                )
+                build_interference_layer(filtered_df, interference_pairs).add_to(m)
+            
+            # Add legend
+            legend_html = """
+            <div style="position: fixed; bottom: 50px; right: 50px; z-index: 1000; background-color: white; 
+                        padding: 10px; border: 2px solid grey; border-radius: 5px;">
+                <p style="text-align: center; font-weight: bold; margin-bottom: 10px;">Legenda Layanan</p>
+            """
+            
+            # Add legend items based on unique services in the filtered_df
+            for service in sorted(map_data['SERVICE'].unique()):
+                service_info = get_service_icon(service)
+                legend_html += f"""
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: {service_info['color']};"></div>
+                    <div>{service}</div>
+                </div>
+                """
+            
+            legend_html += """
+            </div>
+            """
+            
+            # Add legend as HTML
+            m.get_root().html.add_child(folium.Element(legend_html))
+            
+            return m
+        
+        # Display map
+        st.markdown("#### Interactive Map")
+        if display_mode == VIEWPORT_DISPLAY_MODE:
+            # Serve only the tiles in the last reported viewport
+            spatial_index = get_spatial_index(st.session_state.data_id, filter_key, filtered_df)
+            hierarchy = get_cluster_hierarchy(st.session_state.data_id, filter_key, filtered_df)
+            if search_focus is not None:
+                bounds, zoom = get_map_viewport("analysis_map", (st.session_state.data_id, filter_key, map_type, focus_label), search_focus, 12)
+            else:
+                bounds, zoom = get_map_viewport("analysis_map", (st.session_state.data_id, filter_key, map_type), filtered_df, 6)
+            viewport_layer, point_count, clustered_count = build_viewport_layer(filtered_df, spatial_index, hierarchy, bounds, zoom, lazy_popups)
+            
+            # The viewport layer is added after page load, so the page must already load the marker scripts
+            m = build_map()
+            FastMarkerCluster([]).add_to(m)
+            st_folium(m, key="analysis_map", feature_group_to_add=viewport_layer, width=1000, height=600, returned_objects=["bounds", "zoom"])
+            
+            # Show stats about the map
+            st.markdown(f"<div class='info-box'>Menampilkan {point_count:,} titik dan {clustered_count:,} titik dalam klaster pada area peta dari {len(filtered_df):,} data terfilter.</div>", unsafe_allow_html=True)
+        else:
+            # The rendered page is reused until one of the map inputs changes
+            interference_key = (
+                get_saved_setting("interference_distance", 10),
+                get_saved_setting("interference_guard", 0.2)
+            ) if show_interference else None
+            map_key = (
+                st.session_state.data_id, filter_key, map_type, display_mode,
+                max_markers, sampling_method, lazy_popups, heatmap_weight, focus_label, interference_key
+            )
+            show_map_html(get_map_html(map_key, build_map), width=1000, height=600)
+            
+            # Show stats about the map
+            st.markdown(f"<div class='info-box'>Menampilkan {len(map_data):,} titik lokasi dari {len(filtered_df):,} data terfilter.</div>", unsafe_allow_html=True)
+    else:
+        st.warning("Tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
+
+# Function to show the dashboard map as an isolated partial-rerun region
+@st.fragment
+def show_dashboard_map(df, max_markers, sampling_method, lazy_popups, heatmap_weight=None):
+    """Show the dashboard map section; its widgets rerun only this fragment"""
+    st.markdown("### 🗺️ Peta Distribusi Frekuensi")
+    
+    # Map settings in smaller columns
+    map_col1, map_col2, map_col3 = st.columns(3)
+    
+    with map_col1:
+        # Map type selection
+        map_types = ["OpenStreetMap", "Esri Satellite", "CartoDB Dark"]
+        map_type = st.selectbox(
+            "Jenis Peta:",
+            map_types,
+            index=get_saved_index("dash_map_type", map_types),
+            key="dash_map_type",
+            on_change=save_setting,
+            args=("dash_map_type",)
+        )
+    
+    with map_col2:
+        # Service filter for map
+        filter_index = get_filter_index(st.session_state.data_id, df)
+        dash_services = ["All"] + sorted(filter_index['SERVICE'])
+        dash_service = st.selectbox(
+            "Filter Layanan:",
+            dash_services,
+            index=get_saved_index("dash_service", dash_services),
+            key="dash_service",
+            on_change=save_setting,
+            args=("dash_service",)
+        )
+    
+    with map_col3:
+        # Display mode
+        display_modes = ["Markers + Heatmap", "Markers", "Heatmap", VIEWPORT_DISPLAY_MODE]
+        display_mode = st.selectbox(
+            "Mode Tampilan:",
+            display_modes,
+            index=get_saved_index("dash_display_mode", display_modes),
+            key="dash_display_mode",
+            on_change=save_setting,
+            args=("dash_display_mode",)
+        )
+    
+    # Filter data based on selection
+    positions = get_filtered_positions(st.session_state.data_id, (('SERVICE', dash_service),), None, filter_index, None)
+    dash_map_data = df if positions is None else df.iloc[positions]
+    dash_filter_key = (('SERVICE', dash_service),)
+    dash_filtered_data = dash_map_data
+    
+    # Optimize data for map display (viewport mode loads only visible tiles instead)
+    if display_mode != VIEWPORT_DISPLAY_MODE and len(dash_map_data) > max_markers:
+        dash_map_data = dash_map_data.iloc[get_map_sample(st.session_state.data_id, dash_filter_key, max_markers, sampling_method, dash_map_data)]
+        st.info(f"Dataset terlalu besar ({len(df):,} data). Menampilkan sampel {len(dash_map_data):,} titik untuk performa optimal.")
+    
+    # Build the folium map; only called when its rendered HTML is not cached yet
+    def build_map():
+        """Build the dashboard map with plugins, layers and legend"""
+        # Define map center
+        avg_lat = dash_map_data['SID_LAT'].mean()
+        avg_long = dash_map_data['SID_LONG'].mean()
+        
+        # Create base map
+        if map_type == "OpenStreetMap":
+            m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="OpenStreetMap")
+        elif map_type == "Esri Satellite":
+            m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="Esri Satellite")
+        elif map_type == "CartoDB Dark":
+            m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="CartoDB dark_matter")
+        
+        # Add plugins
+        MiniMap().add_to(m)
+        Draw(export=True).add_to(m)
+        LocateControl().add_to(m)
+        Fullscreen().add_to(m)
+        MousePosition().add_to(m)
+        
+        # Create feature group for search functionality
+        feature_group = folium.FeatureGroup(name="Locations")
+        feature_group.add_to(m)
+        
+        # Add search plugin with the feature group
+        Search(
+            layer=feature_group,
+            geom_type="Point",
+            placeholder="Cari lokasi...",
+            collapsed=True,
+            search_zoom=12
+        ).add_to(m)
+        
+        # Add markers
+        if display_mode in ["Markers", "Markers + Heatmap"]:
+            # Add all markers as one client-side layer
+            build_marker_layer(dash_map_data, lazy_popups).add_to(m)
+        
+        # Add heatmap over all stations of the selected service, aggregated to a grid
+        if display_mode in ["Heatmap", "Markers + Heatmap"]:
+            heat_grid = get_heatmap_grid(st.session_state.data_id, dash_filter_key, 5, heatmap_weight, dash_filtered_data)
+            build_heatmap_layer(heat_grid).add_to(m)
+        
+        # Add legend
+        legend_html = """
+        <div style="position: fixed; bottom: 50px; right: 50px; z-index: 1000; background-color: white; 
+                    padding: 10px; border: 2px solid grey; border-radius: 5px;">
+            <p style="text-align: center; font-weight: bold; margin-bottom: 10px;">Legenda Layanan</p>
+        """
+        
+        # Add legend items based on unique services
+        for service in sorted(dash_map_data['SERVICE'].unique()):
+            service_info = get_service_icon(service)
+            legend_html += f"""
+            <div class="legend-item">
+                <div class="legend-color" style="background-color: {service_info['color']};"></div>
+                <div>{service}</div>
+            </div>
+            """
+        
+        legend_html += """
+        </div>
+        """
+        
+        # Add legend as HTML
+        m.get_root().html.add_child(folium.Element(legend_html))
+        
+        return m
+    
+    # Display map
+    if display_mode == VIEWPORT_DISPLAY_MODE:
+        spatial_index = get_spatial_index(st.session_state.data_id, dash_filter_key, dash_map_data)
+        hierarchy = get_cluster_hierarchy(st.session_state.data_id, dash_filter_key, dash_map_data)
+        bounds, zoom = get_map_viewport("dash_map", (st.session_state.data_id, dash_filter_key, map_type), dash_map_data, 5)
+        viewport_layer, point_count, clustered_count = build_viewport_layer(dash_map_data, spatial_index, hierarchy, bounds, zoom, lazy_popups)
+        
+        # The viewport layer is added after page load, so the page must already load the marker scripts
+        m = build_map()
+        FastMarkerCluster([]).add_to(m)
+        st_folium(m, key="dash_map", feature_group_to_add=viewport_layer, width=1000, height=550, returned_objects=["bounds", "zoom"])
+        st.caption(f"Menampilkan {point_count:,} titik dan {clustered_count:,} titik dalam klaster pada area peta.")
+    else:
+        # The rendered page is reused until one of the map inputs changes
+        map_key = (st.session_state.data_id, dash_filter_key, map_type, display_mode, max_markers, sampling_method, lazy_popups, heatmap_weight)
+        show_map_html(get_map_html(map_key, build_map), width=1000, height=550)
+
 # Sidebar for app navigation and settings
 with st.sidebar:
     st.image("komdigi.png", width=250)  # Replace with a frequency management logo
@@ -405,6 +2801,34 @@ with st.sidebar:
         
     st.markdown("---")
     
+    # Stored datasets
+    st.markdown("### Dataset Tersimpan")
+    stored_datasets = list_stored_datasets()
+    
+    if stored_datasets:
+        stored_labels = {
+            metadata['hash']: f"{metadata['name']} ({metadata['rows']:,} baris, {metadata['saved_at'][:10]})"
+            for metadata in stored_datasets
+        }
+        selected_dataset = st.selectbox(
+            "Pilih dataset:",
+            list(stored_labels),
+            format_func=stored_labels.get
+        )
+        
+        load_col, delete_col = st.columns(2)
+        with load_col:
+            if st.button("📂 Muat", key="load_stored_dataset", use_container_width=True):
+                process_stored_dataset(selected_dataset)
+        with delete_col:
+            if st.button("🗑️ Hapus", key="delete_stored_dataset", use_container_width=True):
+                delete_stored_dataset(selected_dataset)
+                st.rerun()
+    else:
+        st.caption("Belum ada dataset tersimpan. Dataset yang diunggah akan disimpan otomatis.")
+    
+    st.markdown("---")
+    
     # Advanced Settings
     st.markdown("### Pengaturan Lanjutan")
     
@@ -422,8 +2846,29 @@ with st.sidebar:
     
     sampling_method = st.selectbox(
         "Metode sampling untuk dataset besar:",
-        ["random", "cluster", "grid"],
-        help="Metode untuk memilih subset data yang representatif jika jumlah baris melebihi jumlah maksimum marker"
+        ["stratified", "random", "cluster", "grid"],
+        help="Metode untuk memilih subset data yang representatif jika jumlah baris melebihi jumlah maksimum marker. "
+             "'stratified' menjaga sebaran per layanan dan wilayah, termasuk layanan yang jarang, dan titiknya tetap stabil saat jumlah marker diubah"
+    )
+    
+    lazy_popups = st.checkbox(
+        "Buat popup saat marker diklik",
+        value=True,
+        help="Hanya data ringkas yang dikirim ke peta; isi popup dibuat di browser ketika marker diklik sehingga peta jauh lebih ringan"
+    )
+    
+    heatmap_weight = HEATMAP_WEIGHT_OPTIONS[st.selectbox(
+        "Bobot heatmap:",
+        list(HEATMAP_WEIGHT_OPTIONS),
+        help="Heatmap dihitung dari seluruh data terfilter dalam bentuk grid kepadatan, bukan hanya dari sampel marker"
+    )]
+    
+    # Memory held by this session's dataset and by all sessions of the server
+    session_bytes, total_bytes = get_session_footprint()
+    st.caption(
+        f"Memori dataset: {session_bytes / 1024 ** 2:,.0f} MB untuk sesi ini, "
+        f"{total_bytes / 1024 ** 2:,.0f} MB dari {DATASET_REGISTRY_MAX_BYTES / 1024 ** 2:,.0f} MB untuk semua sesi. "
+        f"Dataset yang tidak dipakai selama {SESSION_IDLE_TIMEOUT // 60} menit dipindahkan ke disk."
     )
     
     # Display Settings
@@ -442,13 +2887,52 @@ if app_mode == "🗂️ Upload & Analisis":
     # Upload container with styling
     st.markdown('<div class="upload-container">', unsafe_allow_html=True)
     
+    # Upload mode: replace the dataset, or upsert a delta file into it by key
+    upload_mode = "Ganti data"
+    if st.session_state.data_id is not None:
+        upload_mode = st.radio("Mode unggah:", ["Ganti data", "Tambah/gabung ke data saat ini"], horizontal=True, key="upload_mode")
+    if upload_mode != "Ganti data":
+        key_columns = st.multiselect(
+            "Kolom kunci:",
+            REQUIRED_COLUMNS + OPTIONAL_COLUMNS,
+            default=MERGE_KEY_COLUMNS,
+            help="Baris pada file dengan kunci yang sama dengan data saat ini menggantikan baris tersebut; baris lain ditambahkan"
+        )
+    
     # File uploader
     uploaded_file = st.file_uploader("Pilih file CSV untuk diunggah", type=["csv"])
     
-    if uploaded_file is not None and uploaded_file != st.session_state.uploaded_file:
-        st.session_state.uploaded_file = uploaded_file
+    if uploaded_file is not None and uploaded_file.file_id != st.session_state.uploaded_file_id:
+        st.session_state.uploaded_file_id = uploaded_file.file_id
+        st.session_state.quarantine = None
         with st.spinner('Memproses file...'):
-            process_uploaded_file(uploaded_file)
+            if upload_mode == "Ganti data":
+                process_uploaded_file(uploaded_file)
+            else:
+                process_merge_file(uploaded_file, key_columns)
+    
+    # Display upload errors, e.g. when every row failed validation
+    if st.session_state.upload_status == "error":
+        st.error(st.session_state.upload_message)
+    
+    # Quarantined rows of the last upload: counts per rule and a download of the rows
+    if st.session_state.quarantine is not None:
+        quarantine = st.session_state.quarantine
+        with st.expander(f"🚫 Baris Dikarantina ({len(quarantine['rows']):,})", expanded=st.session_state.upload_status == "error"):
+            rule_counts = quarantine['rule_counts'][quarantine['rule_counts'] > 0]
+            st.dataframe(
+                rule_counts.rename_axis('Aturan Validasi').reset_index(name='Jumlah Baris'),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.dataframe(quarantine['rows'].head(1000), use_container_width=True)
+            st.download_button(
+                label="⬇️ Download Tabel Karantina (CSV)",
+                data=lambda: get_export_file(quarantine['rows'], "CSV"),
+                file_name=f"karantina_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime='text/csv',
+                key="download_quarantine"
+            )
     
     # Display upload status messages
     if st.session_state.upload_status == "success":
@@ -459,23 +2943,25 @@ if app_mode == "🗂️ Upload & Analisis":
             for warning in st.session_state.upload_warnings:
                 st.warning(warning)
         
-        # Display data summary
-        if st.session_state.data is not None:
-            df = st.session_state.data
-            
+        # Display data summary from the shared dataset
+        df = get_session_data()
+        if df is not None:
             # Data summary container
             st.markdown("### 📊 Ringkasan Data")
             
+            # Metrics and charts read from the aggregate cube instead of the rows
+            cube = get_aggregate_cube(st.session_state.data_id, None, df)
+            
             # Display metrics in columns
             col1, col2, col3, col4 = st.columns(4)
             with col1:
                 st.metric("Jumlah Baris", f"{len(df):,}")
             with col2:
-                st.metric("Jumlah Kota", f"{df['CITY'].nunique():,}")
+                st.metric("Jumlah Kota", f"{get_cube_nunique(cube, 'CITY'):,}")
             with col3:
-                st.metric("Jumlah Klien", f"{df['CLNT_NAME'].nunique():,}")
+                st.metric("Jumlah Klien", f"{get_cube_nunique(cube, 'CLNT_NAME'):,}")
             with col4:
-                st.metric("Jumlah Layanan", f"{df['SERVICE'].nunique():,}")
+                st.metric("Jumlah Layanan", f"{get_cube_nunique(cube, 'SERVICE'):,}")
             
             # Display preview of the data
             st.markdown("### 🔍 Preview Data")
@@ -487,70 +2973,80 @@ if app_mode == "🗂️ Upload & Analisis":
             # Filter container
             st.markdown('<div class="filter-container">', unsafe_allow_html=True)
             
+            # Per-value row index and sorted frequency index shared by all filters of this dataset
+            filter_index = get_filter_index(st.session_state.data_id, df)
+            freq_index = get_frequency_index(st.session_state.data_id, df) if 'FREQ_MHZ' in df.columns else None
+            has_freq = freq_index is not None and len(freq_index['freqs']) > 0
+            
             # Filter columns
             filter_col1, filter_col2, filter_col3 = st.columns(3)
             
             with filter_col1:
                 # Filter by city
-                cities = ["All"] + sorted(df['CITY'].unique().tolist())
+                cities = ["All"] + sorted(filter_index['CITY'])
                 selected_city = st.selectbox("Filter berdasarkan Kota:", cities)
             
             with filter_col2:
                 # Filter by service
-                services = ["All"] + sorted(df['SERVICE'].unique().tolist())
+                services = ["All"] + sorted(filter_index['SERVICE'])
                 selected_service = st.selectbox("Filter berdasarkan Layanan:", services)
             
             with filter_col3:
                 # Filter by client
-                clients = ["All"] + sorted(df['CLNT_NAME'].unique().tolist())
+                clients = ["All"] + sorted(filter_index['CLNT_NAME'])
                 selected_client = st.selectbox("Filter berdasarkan Klien:", clients)
             
             # Additional filters if frequency data exists
-            if 'FREQ_MHZ' in df.columns:
+            freq_range = None
+            selected_band = "All"
+            include_overlap = False
+            if has_freq:
                 freq_col1, freq_col2 = st.columns(2)
                 
                 with freq_col1:
-                    # Frequency range filter
-                    min_freq = float(df['FREQ_MHZ'].min())
-                    max_freq = float(df['FREQ_MHZ'].max())
+                    # Frequency range filter, bounded by the ends of the sorted index
+                    min_freq = float(freq_index['freqs'][0])
+                    max_freq = float(freq_index['freqs'][-1])
                     freq_range = st.slider(
                         "Rentang Frekuensi (MHz):",
                         min_value=min_freq,
                         max_value=max_freq,
                         value=(min_freq, max_freq)
                     )
+                    
+                    # Match occupied channels (FREQ_MHZ ± BW_MHZ/2) instead of center frequencies
+                    if 'BW_MHZ' in df.columns:
+                        include_overlap = st.checkbox(
+                            "Sertakan kanal yang beririsan dengan rentang (berdasarkan bandwidth)",
+                            value=False
+                        )
                 
                 with freq_col2:
                     # Frequency band filter
-                    bands = ["All"] + sorted(df['FREQ_MHZ'].apply(get_frequency_band).unique().tolist())
+                    bands = ["All"] + [band for band in df['FREQ_BAND'].cat.categories if band in filter_index['FREQ_BAND']]
                     selected_band = st.selectbox("Filter berdasarkan Band:", bands)
             
-            # Apply filters to create filtered dataframe
-            filtered_df = df.copy()
-            
-            # Apply city filter
-            if selected_city != "All":
-                filtered_df = filtered_df[filtered_df['CITY'] == selected_city]
-            
-            # Apply service filter
-            if selected_service != "All":
-                filtered_df = filtered_df[filtered_df['SERVICE'] == selected_service]
+            # Apply all filters by intersecting index entries and frequency range lookups
+            selections = (
+                ('CITY', selected_city),
+                ('SERVICE', selected_service),
+                ('CLNT_NAME', selected_client),
+                ('FREQ_BAND', selected_band)
+            )
+            positions = get_filtered_positions(
+                st.session_state.data_id, selections, freq_range,
+                filter_index, freq_index, include_overlap
+            )
             
-            # Apply client filter
-            if selected_client != "All":
-                filtered_df = filtered_df[filtered_df['CLNT_NAME'] == selected_client]
+            # Only the selected rows are materialized; no filter means no copy
+            filtered_df = df if positions is None else df.iloc[positions]
+            filter_key = (selections, freq_range, include_overlap)
             
-            # Apply frequency filter if exists
-            if 'FREQ_MHZ' in df.columns:
-                # Apply frequency range filter
-                filtered_df = filtered_df[
-                    (filtered_df['FREQ_MHZ'] >= freq_range[0]) & 
-                    (filtered_df['FREQ_MHZ'] <= freq_range[1])
-                ]
-                
-                # Apply band filter
-                if selected_band != "All":
-                    filtered_df = filtered_df[filtered_df['FREQ_MHZ'].apply(get_frequency_band) == selected_band]
+            # Value filters and the full frequency range are a slice of the cube; a narrower range needs its own cube
+            if freq_range is None or freq_range == (float(freq_index['freqs'][0]), float(freq_index['freqs'][-1])):
+                filtered_cube = slice_aggregate_cube(cube, selections, drop_unknown_band=freq_range is not None)
+            else:
+                filtered_cube = get_aggregate_cube(st.session_state.data_id, filter_key, filtered_df)
             
             st.markdown('</div>', unsafe_allow_html=True)  # Close filter container
             
@@ -561,11 +3057,27 @@ if app_mode == "🗂️ Upload & Analisis":
             export_col1, export_col2 = st.columns(2)
             
             with export_col1:
-                # Create download button for filtered CSV
-                csv = filtered_df.to_csv(index=False)
-                b64 = base64.b64encode(csv.encode()).decode()
-                href = f'<a href="data:file/csv;base64,{b64}" download="filtered_frequency_data.csv" class="btn" style="background-color:#1E88E5; color:white; padding:0.5rem 1rem; border-radius:5px; text-decoration:none; display:inline-block; text-align:center;">📥 Download Data Terfilter (CSV)</a>'
-                st.markdown(href, unsafe_allow_html=True)
+                # The file is only generated when the button is clicked
+                export_format = st.selectbox("Format ekspor:", list(EXPORT_FORMATS), key="export_format")
+                extension, mime = EXPORT_FORMATS[export_format]
+                
+                # Very large exports are capped and flagged, since the browser receives the file in one piece
+                export_df = filtered_df.iloc[:EXPORT_MAX_ROWS]
+                if len(filtered_df) > EXPORT_MAX_ROWS:
+                    st.warning(f"Ekspor dibatasi pada {EXPORT_MAX_ROWS:,} baris pertama dari {len(filtered_df):,} baris terfilter. Persempit filter untuk mengekspor sisanya.")
+                export_bytes = get_export_size_estimate(st.session_state.data_id, filter_key, export_format, export_df)
+                if export_bytes > EXPORT_WARN_BYTES:
+                    st.warning(f"Perkiraan ukuran file {export_bytes / 1024 ** 2:,.0f} MB. File dikirim ke browser sekaligus saat diunduh; pertimbangkan format Parquet atau persempit filter.")
+                else:
+                    st.caption(f"Perkiraan ukuran file: {export_bytes / 1024 ** 2:,.1f} MB")
+                
+                st.download_button(
+                    label=f"📥 Download Data Terfilter ({export_format})",
+                    data=lambda: get_export_file(export_df, export_format),
+                    file_name=f"filtered_frequency_data.{extension}",
+                    mime=mime,
+                    key="download_filtered"
+                )
             
             with export_col2:
                 # Show filtered data
@@ -575,366 +3087,497 @@ if app_mode == "🗂️ Upload & Analisis":
             # Data Visualization Section
             st.markdown('<p class="sub-header">📊 Visualisasi Data</p>', unsafe_allow_html=True)
             
-            # Visualization Tabs
-            viz_tab1, viz_tab2, viz_tab3 = st.tabs(["📍 Visualisasi Peta", "📊 Grafik Distribusi", "📈 Analisis Frekuensi"])
+            # Visualization Tabs; a tab switch reruns the script and only the open tab's body is computed
+            viz_tab1, viz_tab2, viz_tab3, viz_tab4 = st.tabs(["📍 Visualisasi Peta", "📊 Grafik Distribusi", "📈 Analisis Frekuensi", "⚠️ Analisis Interferensi"], key="analysis_view", on_change="rerun")
             
             with viz_tab1:
-                st.markdown("### 🗺️ Peta Sebaran Lokasi Frekuensi")
-                
-                # Map settings
-                map_col1, map_col2 = st.columns(2)
-                
-                with map_col1:
-                    # Map type selection
-                    map_type = st.selectbox(
-                        "Pilih Jenis Peta:",
-                        ["OpenStreetMap", "Esri Satellite", "CartoDB Dark", "Stamen Terrain"]
-                    )
-                
-                with map_col2:
-                    # Display mode
-                    display_mode = st.selectbox(
-                        "Mode Tampilan:",
-                        ["Markers", "Heatmap", "Markers + Heatmap"]
-                    )
-                
-                # Create map
-                if len(filtered_df) > 0:
-                    # Optimize data if needed based on performance settings
-                    if len(filtered_df) > max_markers:
-                        map_data = optimize_map_data(filtered_df, max_markers, sampling_method)
-                        st.warning(f"Dataset terfilter terlalu besar ({len(filtered_df):,} baris). Menampilkan sampel {len(map_data):,} titik untuk performa yang lebih baik.")
-                    else:
-                        map_data = filtered_df
-                    
-                    # Define map center (average of coordinates)
-                    avg_lat = map_data['SID_LAT'].mean()
-                    avg_long = map_data['SID_LONG'].mean()
-                    
-                    # Create base map
-                    if map_type == "OpenStreetMap":
-                        m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="OpenStreetMap")
-                    elif map_type == "Esri Satellite":
-                        m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="Esri Satellite")
-                    elif map_type == "CartoDB Dark":
-                        m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="CartoDB dark_matter")
-                    elif map_type == "Stamen Terrain":
-                        m = folium.Map(location=[avg_lat, avg_long], zoom_start=6, tiles="Stamen Terrain")
-                    
-                    # Add plugins
-                    MiniMap().add_to(m)
-                    Draw(export=True).add_to(m)
-                    LocateControl().add_to(m)
-                    Fullscreen().add_to(m)
-                    MousePosition().add_to(m)
-                    
-                    # Add search plugin
-                    # Search(
-                    #    layer=None,
-                    #    geom_type="Point",
-                    #    placeholder="Search location...",
-                    #    collapsed=True,
-                    #    search_zoom=12
-                    # ).add_to(m)
-                    
-                    # Tambahkan ini sebagai pengganti plugin Search
-                    search_query = st.text_input("Cari lokasi:", "")
-                    if search_query:
-                        st.write(f"Mencari: {search_query}")
-                        # Tampilkan filter data berdasarkan pencarian
-                        filtered_results = df[df['CITY'].str.contains(search_query, case=False) | 
-                        df['STN_NAME'].str.contains(search_query, case=False)]
-                        if not filtered_results.empty:
-                            st.dataframe(filtered_results)
-                        else:
-                            st.info("Tidak ditemukan hasil yang cocok")
-                    
-                    
-                    # Create marker cluster for markers
-                    if display_mode in ["Markers", "Markers + Heatmap"]:
-                        marker_cluster = MarkerCluster().add_to(m)
-                        
-                        # Add markers with popups
-                        for _, row in map_data.iterrows():
-                            service_info = get_service_icon(row['SERVICE'])
-                            icon_color = service_info['color']
-                            
-                            # Create custom icon
-                            icon = folium.Icon(
-                                icon=service_info['icon'],
-                                prefix='fa',
-                                color='white',
-                                icon_color=icon_color
-                            )
-                            
-                            # Create popup
-                            popup_content = create_popup_content(row)
-                            popup = folium.Popup(folium.Html(popup_content, script=True), max_width=350)
-                            
-                            # Add marker to cluster
-                            folium.Marker(
-                                location=[row['SID_LAT'], row['SID_LONG']],
-                                popup=popup,
-                                icon=icon,
-                                tooltip=f"{row['STN_NAME']} - {row['SERVICE']}"
-                            ).add_to(marker_cluster)
-                    
-                    # Add heatmap
-                    if display_mode in ["Heatmap", "Markers + Heatmap"]:
-                        # Extract coordinates for heatmap
-                        heat_data = [[row['SID_LAT'], row['SID_LONG']] for _, row in map_data.iterrows()]
-                        
-                        # Add heat map to the map
-                        HeatMap(heat_data, radius=15, blur=10, gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1: 'red'}).add_to(m)
-                    
-                    # Add legend
-                    legend_html = """
-                    <div style="position: fixed; bottom: 50px; right: 50px; z-index: 1000; background-color: white; 
-                                padding: 10px; border: 2px solid grey; border-radius: 5px;">
-                        <p style="text-align: center; font-weight: bold; margin-bottom: 10px;">Legenda Layanan</p>
-                    """
-                    
-                    # Add legend items based on unique services in the filtered_df
-                    for service in sorted(map_data['SERVICE'].unique()):
-                        service_info = get_service_icon(service)
-                        legend_html += f"""
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: {service_info['color']};"></div>
-                            <div>{service}</div>
-                        </div>
-                        """
-                    
-                    legend_html += """
-                    </div>
-                    """
-                    
-                    # Add legend as HTML
-                    m.get_root().html.add_child(folium.Element(legend_html))
-                    
-                    # Display map
-                    st.markdown("#### Interactive Map")
-                    folium_static(m, width=1000, height=600)
-                    
-                    # Show stats about the map
-                    st.markdown(f"<div class='info-box'>Menampilkan {len(map_data):,} titik lokasi dari {len(filtered_df):,} data terfilter.</div>", unsafe_allow_html=True)
-                else:
-                    st.warning("Tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
+                if viz_tab1.open:
+                    show_analysis_map(df, filtered_df, filter_key, has_freq, max_markers, sampling_method, lazy_popups, heatmap_weight)
             
             with viz_tab2:
-                st.markdown("### 📊 Grafik Distribusi")
-                
-                if len(filtered_df) > 0:
-                    # Create distribution charts
-                    dist_tab1, dist_tab2, dist_tab3 = st.tabs(["Distribusi Layanan", "Distribusi Kota", "Distribusi Klien"])
-                    
-                    with dist_tab1:
-                        # Service distribution
-                        service_counts = filtered_df['SERVICE'].value_counts().reset_index()
-                        service_counts.columns = ['SERVICE', 'COUNT']
-                        
-                        # Create bar chart
-                        fig = px.bar(
-                            service_counts, 
-                            x='SERVICE', 
-                            y='COUNT',
-                            color='SERVICE',
-                            title='Distribusi Layanan',
-                            labels={'SERVICE': 'Jenis Layanan', 'COUNT': 'Jumlah'},
-                            color_discrete_sequence=px.colors.qualitative.Bold
-                        )
-                        
-                        # Update layout
-                        fig.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Jumlah')
-                        
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Show percentages as pie chart
-                        pie_fig = px.pie(
-                            service_counts, 
-                            values='COUNT', 
-                            names='SERVICE', 
-                            title='Persentase Jenis Layanan',
-                            color_discrete_sequence=px.colors.qualitative.Bold
-                        )
-                        
-                        # Update layout
-                        pie_fig.update_layout(margin=dict(t=40, b=40, l=40, r=40))
-                        pie_fig.update_traces(textposition='inside', textinfo='percent+label', textfont_size=12)
-                        
-                        # Show plot
-                        st.plotly_chart(pie_fig, use_container_width=True)
+                if viz_tab2.open:
+                    st.markdown("### 📊 Grafik Distribusi")
                     
-                    with dist_tab2:
-                        # City distribution (top 15)
-                        city_counts = filtered_df['CITY'].value_counts().reset_index()
-                        city_counts.columns = ['CITY', 'COUNT']
+                    if len(filtered_df) > 0:
+                        # Create distribution charts
+                        dist_tab1, dist_tab2, dist_tab3 = st.tabs(["Distribusi Layanan", "Distribusi Kota", "Distribusi Klien"], key="distribution_view", on_change="rerun")
                         
-                        # Limit to top 15 cities for readability
-                        if len(city_counts) > 15:
-                            city_counts = city_counts.head(15)
-                            title = 'Distribusi Kota (Top 15)'
-                        else:
-                            title = 'Distribusi Kota'
-                        
-                        # Create horizontal bar chart
-                        fig = px.bar(
-                            city_counts, 
-                            y='CITY', 
-                            x='COUNT',
-                            color='COUNT',
-                            title=title,
-                            labels={'CITY': 'Kota', 'COUNT': 'Jumlah'},
-                            orientation='h',
-                            color_continuous_scale='Blues'
-                        )
-                        
-                        # Update layout
-                        fig.update_layout(yaxis_title='Kota', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
-                        
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
-                    
-                    with dist_tab3:
-                        # Client distribution (top 15)
-                        client_counts = filtered_df['CLNT_NAME'].value_counts().reset_index()
-                        client_counts.columns = ['CLNT_NAME', 'COUNT']
-                        
-                        # Limit to top 15 clients for readability
-                        if len(client_counts) > 15:
-                            client_counts = client_counts.head(15)
-                            title = 'Distribusi Klien (Top 15)'
-                        else:
-                            title = 'Distribusi Klien'
-                        
-                        # Create horizontal bar chart
-                        fig = px.bar(
-                            client_counts, 
-                            y='CLNT_NAME', 
-                            x='COUNT',
-                            color='COUNT',
-                            title=title,
-                            labels={'CLNT_NAME': 'Klien', 'COUNT': 'Jumlah'},
-                            orientation='h',
-                            color_continuous_scale='Greens'
-                        )
+                        with dist_tab1:
+                            if dist_tab1.open:
+                                # Service distribution
+                                service_counts = get_cube_counts(filtered_cube, 'SERVICE').reset_index()
+                                service_counts.columns = ['SERVICE', 'COUNT']
+                                
+                                # Create bar chart
+                                fig = px.bar(
+                                    service_counts, 
+                                    x='SERVICE', 
+                                    y='COUNT',
+                                    color='SERVICE',
+                                    title='Distribusi Layanan',
+                                    labels={'SERVICE': 'Jenis Layanan', 'COUNT': 'Jumlah'},
+                                    color_discrete_sequence=px.colors.qualitative.Bold
+                                )
+                                
+                                # Update layout
+                                fig.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Jumlah')
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
+                                
+                                # Show percentages as pie chart
+                                pie_fig = px.pie(
+                                    service_counts, 
+                                    values='COUNT', 
+                                    names='SERVICE', 
+                                    title='Persentase Jenis Layanan',
+                                    color_discrete_sequence=px.colors.qualitative.Bold
+                                )
+                                
+                                # Update layout
+                                pie_fig.update_layout(margin=dict(t=40, b=40, l=40, r=40))
+                                pie_fig.update_traces(textposition='inside', textinfo='percent+label', textfont_size=12)
+                                
+                                # Show plot
+                                st.plotly_chart(pie_fig, use_container_width=True)
                         
-                        # Update layout
-                        fig.update_layout(yaxis_title='Klien', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
+                        with dist_tab2:
+                            if dist_tab2.open:
+                                # City distribution (top 15)
+                                city_counts = get_cube_counts(filtered_cube, 'CITY').reset_index()
+                                city_counts.columns = ['CITY', 'COUNT']
+                                
+                                # Limit to top 15 cities for readability
+                                if len(city_counts) > 15:
+                                    city_counts = city_counts.head(15)
+                                    title = 'Distribusi Kota (Top 15)'
+                                else:
+                                    title = 'Distribusi Kota'
+                                
+                                # Create horizontal bar chart
+                                fig = px.bar(
+                                    city_counts, 
+                                    y='CITY', 
+                                    x='COUNT',
+                                    color='COUNT',
+                                    title=title,
+                                    labels={'CITY': 'Kota', 'COUNT': 'Jumlah'},
+                                    orientation='h',
+                                    color_continuous_scale='Blues'
+                                )
+                                
+                                # Update layout
+                                fig.update_layout(yaxis_title='Kota', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
                         
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("Tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
+                        with dist_tab3:
+                            if dist_tab3.open:
+                                # Client distribution (top 15)
+                                client_counts = get_cube_counts(filtered_cube, 'CLNT_NAME').reset_index()
+                                client_counts.columns = ['CLNT_NAME', 'COUNT']
+                                
+                                # Limit to top 15 clients for readability
+                                if len(client_counts) > 15:
+                                    client_counts = client_counts.head(15)
+                                    title = 'Distribusi Klien (Top 15)'
+                                else:
+                                    title = 'Distribusi Klien'
+                                
+                                # Create horizontal bar chart
+                                fig = px.bar(
+                                    client_counts, 
+                                    y='CLNT_NAME', 
+                                    x='COUNT',
+                                    color='COUNT',
+                                    title=title,
+                                    labels={'CLNT_NAME': 'Klien', 'COUNT': 'Jumlah'},
+                                    orientation='h',
+                                    color_continuous_scale='Greens'
+                                )
+                                
+                                # Update layout
+                                fig.update_layout(yaxis_title='Klien', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.warning("Tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
             
             with viz_tab3:
-                st.markdown("### 📈 Analisis Frekuensi")
-                
-                if 'FREQ_MHZ' in filtered_df.columns and len(filtered_df) > 0:
-                    # Frequency analysis
-                    freq_tab1, freq_tab2, freq_tab3 = st.tabs(["Distribusi Frekuensi", "Frekuensi per Layanan", "Visualisasi 3D"])
+                if viz_tab3.open:
+                    st.markdown("### 📈 Analisis Frekuensi")
                     
-                    with freq_tab1:
-                        # Create histogram of frequencies
-                        fig = px.histogram(
-                            filtered_df,
-                            x='FREQ_MHZ',
-                            nbins=50,
-                            title='Distribusi Frekuensi',
-                            labels={'FREQ_MHZ': 'Frekuensi (MHz)'},
-                            color_discrete_sequence=['#1E88E5']
+                    if has_freq and len(filtered_df) > 0:
+                        # Log scale spreads HF to EHF evenly per decade
+                        log_scale = st.checkbox(
+                            "Skala frekuensi logaritmik",
+                            value=get_saved_setting("freq_log_scale", True),
+                            key="freq_log_scale",
+                            on_change=save_setting,
+                            args=("freq_log_scale",)
                         )
                         
-                        # Update layout
-                        fig.update_layout(xaxis_title='Frekuensi (MHz)', yaxis_title='Jumlah')
-                        
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
+                        # Frequency analysis
+                        freq_tab1, freq_tab2, freq_tab3, freq_tab4 = st.tabs(["Distribusi Frekuensi", "Frekuensi per Layanan", "Visualisasi 3D", "Perencanaan Spektrum"], key="frequency_view", on_change="rerun")
                         
-                        # Add band distribution
-                        filtered_df['FREQ_BAND'] = filtered_df['FREQ_MHZ'].apply(get_frequency_band)
-                        band_counts = filtered_df['FREQ_BAND'].value_counts().reset_index()
-                        band_counts.columns = ['FREQ_BAND', 'COUNT']
+                        with freq_tab1:
+                            if freq_tab1.open:
+                                # Sorted frequencies come straight from the index when only the range is filtered
+                                if not include_overlap and all(value == "All" for _, value in selections):
+                                    sorted_freqs = freq_index['freqs'][get_frequency_slice(freq_index, *freq_range)]
+                                else:
+                                    sorted_freqs = np.sort(filtered_df['FREQ_MHZ'].dropna().to_numpy())
+                                
+                                # Create histogram of frequencies from binned counts
+                                edges, counts = get_frequency_histogram(sorted_freqs, log_scale=log_scale)
+                                if log_scale:
+                                    # Bars have no width on a log axis, so draw the bins as a filled step line
+                                    fig = go.Figure(go.Scatter(
+                                        x=np.repeat(edges, 2)[1:-1],
+                                        y=np.repeat(counts, 2),
+                                        mode='lines',
+                                        fill='tozeroy',
+                                        line=dict(color='#1E88E5'),
+                                        hovertemplate='%{x:,.3f} MHz<br>Jumlah: %{y:,}<extra></extra>'
+                                    ))
+                                    fig.update_layout(title='Distribusi Frekuensi', xaxis_type='log')
+                                else:
+                                    hist_df = pd.DataFrame({'FREQ_MHZ': (edges[:-1] + edges[1:]) / 2, 'COUNT': counts})
+                                    fig = px.bar(
+                                        hist_df,
+                                        x='FREQ_MHZ',
+                                        y='COUNT',
+                                        title='Distribusi Frekuensi',
+                                        labels={'FREQ_MHZ': 'Frekuensi (MHz)', 'COUNT': 'Jumlah'},
+                                        color_discrete_sequence=['#1E88E5']
+                                    )
+                                    fig.update_traces(width=np.diff(edges))
+                                
+                                # Update layout
+                                fig.update_layout(xaxis_title='Frekuensi (MHz)', yaxis_title='Jumlah', bargap=0)
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
+                                
+                                # Add band distribution
+                                band_counts = get_cube_counts(filtered_cube, 'FREQ_BAND', sort=False).reset_index()
+                                band_counts.columns = ['FREQ_BAND', 'COUNT']
+                                band_counts = band_counts[band_counts['COUNT'] > 0]
+                                band_counts['FREQ_BAND'] = band_counts['FREQ_BAND'].astype(str)
+                                
+                                # Create band distribution chart
+                                band_fig = px.bar(
+                                    band_counts,
+                                    x='FREQ_BAND',
+                                    y='COUNT',
+                                    color='FREQ_BAND',
+                                    title='Distribusi Band Frekuensi',
+                                    labels={'FREQ_BAND': 'Band Frekuensi', 'COUNT': 'Jumlah'},
+                                    category_orders={'FREQ_BAND': band_counts['FREQ_BAND'].tolist()}
+                                )
+                                
+                                # Update layout
+                                band_fig.update_layout(xaxis_title='Band Frekuensi', yaxis_title='Jumlah')
+                                
+                                # Show plot
+                                st.plotly_chart(band_fig, use_container_width=True)
                         
-                        # Create band distribution chart
-                        band_fig = px.bar(
-                            band_counts,
-                            x='FREQ_BAND',
-                            y='COUNT',
-                            color='FREQ_BAND',
-                            title='Distribusi Band Frekuensi',
-                            labels={'FREQ_BAND': 'Band Frekuensi', 'COUNT': 'Jumlah'}
-                        )
+                        with freq_tab2:
+                            if freq_tab2.open:
+                                # Box plot of frequency by service, drawn from precomputed quartiles
+                                box_stats, outliers = get_frequency_box_data(st.session_state.data_id, filter_key, filtered_df)
+                                colors = px.colors.qualitative.Plotly
+                                fig = go.Figure()
+                                for i, row in enumerate(box_stats.itertuples(index=False)):
+                                    color = colors[i % len(colors)]
+                                    fig.add_trace(go.Box(
+                                        x=[row.SERVICE],
+                                        q1=[row.Q1],
+                                        median=[row.MEDIAN],
+                                        q3=[row.Q3],
+                                        lowerfence=[row.LOWER_FENCE],
+                                        upperfence=[row.UPPER_FENCE],
+                                        name=str(row.SERVICE),
+                                        legendgroup=str(row.SERVICE),
+                                        marker_color=color,
+                                        boxpoints=False
+                                    ))
+                                    
+                                    # Thinned outliers as a WebGL trace
+                                    service_outliers = outliers.loc[outliers['SERVICE'] == row.SERVICE, 'FREQ_MHZ']
+                                    if len(service_outliers) > 0:
+                                        fig.add_trace(go.Scattergl(
+                                            x=[row.SERVICE] * len(service_outliers),
+                                            y=service_outliers,
+                                            mode='markers',
+                                            name=str(row.SERVICE),
+                                            legendgroup=str(row.SERVICE),
+                                            showlegend=False,
+                                            marker=dict(color=color, size=4)
+                                        ))
+                                
+                                # Update layout
+                                fig.update_layout(
+                                    title='Distribusi Frekuensi per Layanan',
+                                    xaxis_title='Jenis Layanan',
+                                    yaxis_title='Frekuensi (MHz)',
+                                    yaxis_type='log' if log_scale else 'linear'
+                                )
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
+                                
+                                # Calculate average frequency per service
+                                avg_freq = get_cube_frequency_stats(filtered_cube, 'SERVICE')
+                                avg_freq.columns = ['SERVICE', 'AVG_FREQ', 'STD_FREQ']
+                                avg_freq = avg_freq.sort_values('AVG_FREQ')
+                                
+                                # Create bar chart of average frequencies
+                                avg_fig = px.bar(
+                                    avg_freq,
+                                    y='SERVICE',
+                                    x='AVG_FREQ',
+                                    color='SERVICE',
+                                    title='Rata-rata Frekuensi per Layanan',
+                                    labels={'SERVICE': 'Jenis Layanan', 'AVG_FREQ': 'Rata-rata Frekuensi (MHz)'},
+                                    orientation='h'
+                                )
+                                
+                                # Update layout
+                                avg_fig.update_layout(yaxis_title='Jenis Layanan', xaxis_title='Rata-rata Frekuensi (MHz)')
+                                
+                                # Show plot
+                                st.plotly_chart(avg_fig, use_container_width=True)
                         
-                        # Update layout
-                        band_fig.update_layout(xaxis_title='Band Frekuensi', yaxis_title='Jumlah')
+                        with freq_tab3:
+                            if freq_tab3.open:
+                                # Dense regions are merged into weighted points so the payload stays bounded
+                                scatter_data = get_scatter_3d_data(st.session_state.data_id, filter_key, log_scale, filtered_df)
+                                if scatter_data['COUNT'].sum() > len(scatter_data):
+                                    st.caption(
+                                        f"Menampilkan {len(scatter_data):,} titik representatif untuk "
+                                        f"{int(scatter_data['COUNT'].sum()):,} stasiun; ukuran titik menunjukkan jumlah stasiun."
+                                    )
+                                
+                                # 3D scatter plot of locations and frequencies, sized by log station count
+                                scatter_data['SIZE'] = 1 + np.log2(scatter_data['COUNT'])
+                                fig = px.scatter_3d(
+                                    scatter_data,
+                                    x='SID_LONG',
+                                    y='SID_LAT',
+                                    z='FREQ_MHZ',
+                                    color='SERVICE',
+                                    size='SIZE',
+                                    size_max=12,
+                                    hover_data={'COUNT': True, 'SIZE': False},
+                                    log_z=log_scale,
+                                    title='Visualisasi 3D Lokasi dan Frekuensi',
+                                    labels={
+                                        'SID_LONG': 'Longitude',
+                                        'SID_LAT': 'Latitude',
+                                        'FREQ_MHZ': 'Frekuensi (MHz)',
+                                        'SERVICE': 'Jenis Layanan',
+                                        'COUNT': 'Jumlah Stasiun'
+                                    }
+                                )
+                                fig.update_traces(marker=dict(line=dict(width=0)))
+                                
+                                # Update layout
+                                fig.update_layout(margin=dict(l=0, r=0, b=0, t=30))
+                                
+                                # Show plot
+                                st.plotly_chart(fig, use_container_width=True)
                         
-                        # Show plot
-                        st.plotly_chart(band_fig, use_container_width=True)
+                        with freq_tab4:
+                            if freq_tab4.open:
+                                # Region selection
+                                region_col1, region_col2, region_col3 = st.columns(3)
+                                
+                                with region_col1:
+                                    region_modes = ["Seluruh data terfilter", "Kota", "Radius dari kota"]
+                                    region_mode = st.selectbox(
+                                        "Wilayah:",
+                                        region_modes,
+                                        index=get_saved_index("region_mode", region_modes),
+                                        key="region_mode",
+                                        on_change=save_setting,
+                                        args=("region_mode",)
+                                    )
+                                
+                                with region_col2:
+                                    region_cities = sorted(filter_index['CITY'])
+                                    region_city = st.selectbox(
+                                        "Kota:",
+                                        region_cities,
+                                        index=get_saved_index("region_city", region_cities),
+                                        disabled=region_mode == "Seluruh data terfilter",
+                                        key="region_city",
+                                        on_change=save_setting,
+                                        args=("region_city",)
+                                    )
+                                
+                                with region_col3:
+                                    region_radius = st.slider(
+                                        "Radius (km):", 1, 200, get_saved_setting("region_radius", 25),
+                                        disabled=region_mode != "Radius dari kota",
+                                        key="region_radius",
+                                        on_change=save_setting,
+                                        args=("region_radius",)
+                                    )
+                                
+                                if region_mode == "Kota":
+                                    region = ('city', region_city)
+                                elif region_mode == "Radius dari kota":
+                                    region = ('radius', region_city, region_radius)
+                                else:
+                                    region = ('all',)
+                                
+                                occupancy = get_region_occupancy(st.session_state.data_id, filter_key, region, filtered_df)
+                                
+                                if occupancy['stations'] > 0:
+                                    # Occupancy per band
+                                    band_occupancy = get_band_occupancy(occupancy)
+                                    band_occupancy = band_occupancy[band_occupancy['OCCUPIED_MHZ'] > 0]
+                                    
+                                    occupancy_fig = px.bar(
+                                        band_occupancy,
+                                        x='FREQ_BAND',
+                                        y='OCCUPANCY_PCT',
+                                        color='FREQ_BAND',
+                                        title=f'Okupansi Spektrum per Band ({occupancy["stations"]:,} stasiun)',
+                                        labels={'FREQ_BAND': 'Band Frekuensi', 'OCCUPANCY_PCT': 'Okupansi (%)'},
+                                        hover_data={'OCCUPIED_MHZ': ':.3f'}
+                                    )
+                                    occupancy_fig.update_layout(xaxis_title='Band Frekuensi', yaxis_title='Okupansi (%)')
+                                    st.plotly_chart(occupancy_fig, use_container_width=True)
+                                    
+                                    # Free block finder
+                                    st.markdown("#### Pencarian Blok Frekuensi Kosong")
+                                    gap_col1, gap_col2, gap_col3 = st.columns(3)
+                                    
+                                    with gap_col1:
+                                        gap_low = st.number_input(
+                                            "Dari (MHz):", min_value=0.0, value=get_saved_setting("gap_low", 1800.0), step=10.0,
+                                            key="gap_low", on_change=save_setting, args=("gap_low",)
+                                        )
+                                    
+                                    with gap_col2:
+                                        gap_high = st.number_input(
+                                            "Sampai (MHz):", min_value=0.0, value=get_saved_setting("gap_high", 2600.0), step=10.0,
+                                            key="gap_high", on_change=save_setting, args=("gap_high",)
+                                        )
+                                    
+                                    with gap_col3:
+                                        gap_width = st.number_input(
+                                            "Lebar minimum (MHz):", min_value=0.0, value=get_saved_setting("gap_width", 20.0), step=1.0,
+                                            key="gap_width", on_change=save_setting, args=("gap_width",)
+                                        )
+                                    
+                                    if gap_high > gap_low:
+                                        free_gaps = find_free_gaps(occupancy, gap_low, gap_high, gap_width)
+                                        occupied_mhz = get_covered_length(occupancy, gap_high) - get_covered_length(occupancy, gap_low)
+                                        
+                                        st.markdown(f"<div class='info-box'>{len(free_gaps):,} blok kosong ≥ {gap_width:g} MHz antara {gap_low:g}-{gap_high:g} MHz. Terisi {occupied_mhz:,.3f} dari {gap_high - gap_low:,.3f} MHz ({100 * occupied_mhz / (gap_high - gap_low):.1f}%).</div>", unsafe_allow_html=True)
+                                        
+                                        if len(free_gaps) > 0:
+                                            st.dataframe(free_gaps.round(4), use_container_width=True)
+                                    else:
+                                        st.warning("Batas atas rentang harus lebih besar dari batas bawah.")
+                                else:
+                                    st.info("Tidak ada stasiun dengan data frekuensi di wilayah ini.")
+                    else:
+                        st.warning("Data frekuensi tidak tersedia atau tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
+            
+            with viz_tab4:
+                if viz_tab4.open:
+                    st.markdown("### ⚠️ Analisis Interferensi")
                     
-                    with freq_tab2:
-                        # Box plot of frequency by service
-                        fig = px.box(
-                            filtered_df,
-                            x='SERVICE',
-                            y='FREQ_MHZ',
-                            color='SERVICE',
-                            title='Distribusi Frekuensi per Layanan',
-                            labels={'SERVICE': 'Jenis Layanan', 'FREQ_MHZ': 'Frekuensi (MHz)'}
-                        )
+                    if has_freq and len(filtered_df) > 0:
+                        # Interference settings
+                        int_col1, int_col2 = st.columns(2)
                         
-                        # Update layout
-                        fig.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Frekuensi (MHz)')
-                        
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        # Calculate average frequency per service
-                        avg_freq = filtered_df.groupby('SERVICE')['FREQ_MHZ'].mean().reset_index()
-                        avg_freq.columns = ['SERVICE', 'AVG_FREQ']
-                        avg_freq = avg_freq.sort_values('AVG_FREQ')
-                        
-                        # Create bar chart of average frequencies
-                        avg_fig = px.bar(
-                            avg_freq,
-                            y='SERVICE',
-                            x='AVG_FREQ',
-                            color='SERVICE',
-                            title='Rata-rata Frekuensi per Layanan',
-                            labels={'SERVICE': 'Jenis Layanan', 'AVG_FREQ': 'Rata-rata Frekuensi (MHz)'},
-                            orientation='h'
-                        )
-                        
-                        # Update layout
-                        avg_fig.update_layout(yaxis_title='Jenis Layanan', xaxis_title='Rata-rata Frekuensi (MHz)')
+                        with int_col1:
+                            max_distance_km = st.slider(
+                                "Jarak maksimum antar stasiun (km):", 1, 100, get_saved_setting("interference_distance", 10),
+                                key="interference_distance",
+                                on_change=save_setting,
+                                args=("interference_distance",)
+                            )
                         
-                        # Show plot
-                        st.plotly_chart(avg_fig, use_container_width=True)
-                    
-                    with freq_tab3:
-                        # 3D scatter plot of locations and frequencies
-                        fig = px.scatter_3d(
-                            filtered_df,
-                            x='SID_LONG',
-                            y='SID_LAT',
-                            z='FREQ_MHZ',
-                            color='SERVICE',
-                            title='Visualisasi 3D Lokasi dan Frekuensi',
-                            labels={
-                                'SID_LONG': 'Longitude',
-                                'SID_LAT': 'Latitude',
-                                'FREQ_MHZ': 'Frekuensi (MHz)',
-                                'SERVICE': 'Jenis Layanan'
-                            }
-                        )
+                        with int_col2:
+                            guard_mhz = st.number_input(
+                                "Guard band kanal bersebelahan (MHz):",
+                                min_value=0.0, max_value=50.0, value=get_saved_setting("interference_guard", 0.2), step=0.1,
+                                key="interference_guard",
+                                on_change=save_setting,
+                                args=("interference_guard",)
+                            )
                         
-                        # Update layout
-                        fig.update_layout(margin=dict(l=0, r=0, b=0, t=30))
+                        st.markdown("<div class='info-box'>Pasangan stasiun dalam jarak yang dipilih dengan rentang FREQ_MHZ ± BW_MHZ/2 yang beririsan (co-channel) atau berjarak tidak lebih dari guard band (kanal bersebelahan).</div>", unsafe_allow_html=True)
                         
-                        # Show plot
-                        st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("Data frekuensi tidak tersedia atau tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
+                        if st.checkbox(
+                            "Jalankan analisis interferensi",
+                            value=get_saved_setting("run_interference", False),
+                            key="run_interference",
+                            on_change=save_setting,
+                            args=("run_interference",)
+                        ):
+                            interference_pairs, truncated = get_interference_pairs(
+                                st.session_state.data_id, filter_key, max_distance_km, guard_mhz, filtered_df
+                            )
+                            
+                            if truncated:
+                                st.warning(f"Ditemukan lebih dari {INTERFERENCE_MAX_PAIRS:,} pasangan. Hasil dibatasi; perkecil jarak atau persempit filter.")
+                            
+                            # Summary metrics
+                            type_counts = interference_pairs['TYPE'].value_counts()
+                            int_metric1, int_metric2, int_metric3 = st.columns(3)
+                            with int_metric1:
+                                st.metric("Pasangan Konflik", f"{len(interference_pairs):,}")
+                            with int_metric2:
+                                st.metric("Co-channel", f"{type_counts.get('Co-channel', 0):,}")
+                            with int_metric3:
+                                st.metric("Kanal Bersebelahan", f"{type_counts.get('Adjacent', 0):,}")
+                            
+                            if len(interference_pairs) > 0:
+                                # Conflicts per service and city
+                                int_tab1, int_tab2, int_tab3 = st.tabs(["Per Layanan", "Per Kota", "Daftar Pasangan"], key="interference_view", on_change="rerun")
+                                
+                                for summary_tab, column, label in ((int_tab1, 'SERVICE', 'Jenis Layanan'), (int_tab2, 'CITY', 'Kota')):
+                                    with summary_tab:
+                                        if summary_tab.open:
+                                            summary = get_interference_summary(filtered_df, interference_pairs, column)
+                                            types = [kind for kind in INTERFERENCE_COLORS if kind in summary.columns]
+                                            fig = px.bar(
+                                                summary.head(20),
+                                                x=column,
+                                                y=types,
+                                                title=f'Stasiun Terlibat Konflik per {label}',
+                                                labels={column: label, 'value': 'Jumlah', 'variable': 'Tipe'},
+                                                color_discrete_map=INTERFERENCE_COLORS
+                                            )
+                                            fig.update_layout(xaxis_title=label, yaxis_title='Jumlah')
+                                            st.plotly_chart(fig, use_container_width=True)
+                                            st.dataframe(summary, use_container_width=True)
+                                
+                                with int_tab3:
+                                    if int_tab3.open:
+                                        interference_table = get_interference_table(filtered_df, interference_pairs)
+                                        st.dataframe(interference_table.head(1000), use_container_width=True)
+                                        
+                                        # Export all pairs
+                                        st.download_button(
+                                            label="⬇️ Download Hasil Interferensi (CSV)",
+                                            data=lambda: interference_table.to_csv(index=False),
+                                            file_name=f"interferensi_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                            mime='text/csv'
+                                        )
+                            else:
+                                st.success("Tidak ditemukan potensi interferensi dengan pengaturan ini.")
+                    else:
+                        st.warning("Data frekuensi tidak tersedia atau tidak ada data untuk ditampilkan. Silakan sesuaikan filter.")
     else:
         # Display guide on how to upload
         st.info("Belum ada data yang diunggah. Silakan unggah file CSV dengan data frekuensi.")
@@ -990,11 +3633,11 @@ Semarang,PT Radio Indonesia,Semarang Station,Radio,AM Radio,-6.9932,110.4203,540
     
 elif app_mode == "📊 Dashboard":
     # Dashboard display - check if data exists
-    if st.session_state.data is not None:
+    df = get_session_data()
+    if df is not None:
         st.markdown('<p class="sub-header">📊 Dashboard Informasi Frekuensi</p>', unsafe_allow_html=True)
         
-        # Get dataframe from session state
-        df = st.session_state.data
+        cube = get_aggregate_cube(st.session_state.data_id, None, df)
         
         # Dashboard metrics
         st.markdown("### 📌 Ringkasan")
@@ -1009,351 +3652,216 @@ elif app_mode == "📊 Dashboard":
         
         with col2:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("Jumlah Kota", f"{df['CITY'].nunique():,}")
+            st.metric("Jumlah Kota", f"{get_cube_nunique(cube, 'CITY'):,}")
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col3:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("Jumlah Klien", f"{df['CLNT_NAME'].nunique():,}")
+            st.metric("Jumlah Klien", f"{get_cube_nunique(cube, 'CLNT_NAME'):,}")
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col4:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("Jenis Layanan", f"{df['SERVICE'].nunique():,}")
+            st.metric("Jenis Layanan", f"{get_cube_nunique(cube, 'SERVICE'):,}")
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col5:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             if 'FREQ_MHZ' in df.columns:
-                avg_freq = df['FREQ_MHZ'].mean()
+                avg_freq = get_cube_frequency_mean(cube)
                 if avg_freq >= 1000:
                     freq_display = f"{avg_freq/1000:.2f} GHz"
                 else:
                     freq_display = f"{avg_freq:.2f} MHz"
                 st.metric("Rata-rata Frekuensi", freq_display)
             else:
-                st.metric("Sub Layanan", f"{df['SUBSERVICE'].nunique():,}")
+                st.metric("Sub Layanan", f"{get_cube_nunique(cube, 'SUBSERVICE'):,}")
             st.markdown('</div>', unsafe_allow_html=True)
         
-        # Create dashboard tabs
-        dash_tab1, dash_tab2, dash_tab3 = st.tabs(["🌍 Peta Utama", "📊 Statistik Layanan", "🏙️ Distribusi Kota"])
+        # Create dashboard tabs, computing only the open one
+        dash_tab1, dash_tab2, dash_tab3 = st.tabs(["🌍 Peta Utama", "📊 Statistik Layanan", "🏙️ Distribusi Kota"], key="dashboard_view", on_change="rerun")
         
         with dash_tab1:
-            st.markdown("### 🗺️ Peta Distribusi Frekuensi")
-            
-            # Map settings in smaller columns
-            map_col1, map_col2, map_col3 = st.columns(3)
-            
-            with map_col1:
-                # Map type selection
-                map_type = st.selectbox(
-                    "Jenis Peta:",
-                    ["OpenStreetMap", "Esri Satellite", "CartoDB Dark"],
-                    key="dash_map_type"
-                )
-            
-            with map_col2:
-                # Service filter for map
-                dash_services = ["All"] + sorted(df['SERVICE'].unique().tolist())
-                dash_service = st.selectbox("Filter Layanan:", dash_services, key="dash_service")
-            
-            with map_col3:
-                # Display mode
-                display_mode = st.selectbox(
-                    "Mode Tampilan:",
-                    ["Markers + Heatmap", "Markers", "Heatmap"],
-                    key="dash_display_mode"
+            if dash_tab1.open:
+                show_dashboard_map(df, max_markers, sampling_method, lazy_popups, heatmap_weight)
+        
+        with dash_tab2:
+            if dash_tab2.open:
+                st.markdown("### 📊 Statistik Layanan Frekuensi")
+                
+                # Create service statistics
+                service_counts = get_cube_counts(cube, 'SERVICE').reset_index()
+                service_counts.columns = ['SERVICE', 'COUNT']
+                
+                # Create bar chart
+                fig = px.bar(
+                    service_counts,
+                    x='SERVICE',
+                    y='COUNT',
+                    color='SERVICE',
+                    title='Distribusi Jenis Layanan',
+                    labels={'SERVICE': 'Jenis Layanan', 'COUNT': 'Jumlah'}
                 )
-            
-            # Filter data based on selection
-            if dash_service != "All":
-                dash_map_data = df[df['SERVICE'] == dash_service].copy()
-            else:
-                dash_map_data = df.copy()
-            
-            # Optimize data for map display
-            if len(dash_map_data) > max_markers:
-                dash_map_data = optimize_map_data(dash_map_data, max_markers, sampling_method)
-                st.info(f"Dataset terlalu besar ({len(df):,} data). Menampilkan sampel {len(dash_map_data):,} titik untuk performa optimal.")
-            
-            # Define map center
-            avg_lat = dash_map_data['SID_LAT'].mean()
-            avg_long = dash_map_data['SID_LONG'].mean()
-            
-            # Create base map
-            if map_type == "OpenStreetMap":
-                m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="OpenStreetMap")
-            elif map_type == "Esri Satellite":
-                m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="Esri Satellite")
-            elif map_type == "CartoDB Dark":
-                m = folium.Map(location=[avg_lat, avg_long], zoom_start=5, tiles="CartoDB dark_matter")
-            
-            # Add plugins
-            MiniMap().add_to(m)
-            Draw(export=True).add_to(m)
-            LocateControl().add_to(m)
-            Fullscreen().add_to(m)
-            MousePosition().add_to(m)
-            
-            # Create feature group for search functionality
-            feature_group = folium.FeatureGroup(name="Locations")
-            feature_group.add_to(m)
-            
-            # Add search plugin with the feature group
-            Search(
-                layer=feature_group,
-                geom_type="Point",
-                placeholder="Cari lokasi...",
-                collapsed=True,
-                search_zoom=12
-            ).add_to(m)
-            
-            # Add markers
-            if display_mode in ["Markers", "Markers + Heatmap"]:
-                marker_cluster = MarkerCluster().add_to(m)
                 
-                # Add markers with popups
-                for _, row in dash_map_data.iterrows():
-                    service_info = get_service_icon(row['SERVICE'])
-                    icon_color = service_info['color']
+                # Update layout
+                fig.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Jumlah')
+                
+                # Show plot
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # Check if frequency data exists
+                if 'FREQ_MHZ' in df.columns:
+                    # Subservice by frequency
+                    subservice_freq = get_cube_frequency_stats(cube, ['SERVICE', 'SUBSERVICE'])
                     
-                    # Create custom icon
-                    icon = folium.Icon(
-                        icon=service_info['icon'],
-                        prefix='fa',
-                        color='white',
-                        icon_color=icon_color
+                    # Create grouped bar chart
+                    fig2 = px.bar(
+                        subservice_freq,
+                        x='SERVICE',
+                        y='FREQ_MHZ',
+                        color='SUBSERVICE',
+                        title='Rata-rata Frekuensi per Subservice',
+                        labels={'SERVICE': 'Jenis Layanan', 'FREQ_MHZ': 'Rata-rata Frekuensi (MHz)', 'SUBSERVICE': 'Sub-layanan'}
                     )
                     
-                    # Create popup
-                    popup_content = create_popup_content(row)
-                    popup = folium.Popup(folium.Html(popup_content, script=True), max_width=350)
+                    # Update layout
+                    fig2.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Rata-rata Frekuensi (MHz)')
                     
-                    # Add marker to cluster
-                    folium.Marker(
-                        location=[row['SID_LAT'], row['SID_LONG']],
-                        popup=popup,
-                        icon=icon,
-                        tooltip=f"{row['STN_NAME']} - {row['SERVICE']}"
-                    ).add_to(marker_cluster)
-            
-            # Add heatmap
-            if display_mode in ["Heatmap", "Markers + Heatmap"]:
-                # Extract coordinates for heatmap
-                heat_data = [[row['SID_LAT'], row['SID_LONG']] for _, row in dash_map_data.iterrows()]
+                    # Show plot
+                    st.plotly_chart(fig2, use_container_width=True)
                 
-                # Add heat map to the map
-                HeatMap(heat_data, radius=15, blur=10, gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1: 'red'}).add_to(m)
-            
-            # Add legend
-            legend_html = """
-            <div style="position: fixed; bottom: 50px; right: 50px; z-index: 1000; background-color: white; 
-                        padding: 10px; border: 2px solid grey; border-radius: 5px;">
-                <p style="text-align: center; font-weight: bold; margin-bottom: 10px;">Legenda Layanan</p>
-            """
-            
-            # Add legend items based on unique services
-            for service in sorted(dash_map_data['SERVICE'].unique()):
-                service_info = get_service_icon(service)
-                legend_html += f"""
-                <div class="legend-item">
-                    <div class="legend-color" style="background-color: {service_info['color']};"></div>
-                    <div>{service}</div>
-                </div>
-                """
-            
-            legend_html += """
-            </div>
-            """
-            
-            # Add legend as HTML
-            m.get_root().html.add_child(folium.Element(legend_html))
-            
-            # Display map
-            folium_static(m, width=1000, height=550)
-        
-        with dash_tab2:
-            st.markdown("### 📊 Statistik Layanan Frekuensi")
-            
-            # Create service statistics
-            service_counts = df['SERVICE'].value_counts().reset_index()
-            service_counts.columns = ['SERVICE', 'COUNT']
-            
-            # Create bar chart
-            fig = px.bar(
-                service_counts,
-                x='SERVICE',
-                y='COUNT',
-                color='SERVICE',
-                title='Distribusi Jenis Layanan',
-                labels={'SERVICE': 'Jenis Layanan', 'COUNT': 'Jumlah'}
-            )
-            
-            # Update layout
-            fig.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Jumlah')
-            
-            # Show plot
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Check if frequency data exists
-            if 'FREQ_MHZ' in df.columns:
-                # Subservice by frequency
-                subservice_freq = df.groupby(['SERVICE', 'SUBSERVICE'])['FREQ_MHZ'].mean().reset_index()
+                # Subservice distribution
+                subservice_counts = get_cube_counts(cube, 'SUBSERVICE').reset_index()
+                subservice_counts.columns = ['SUBSERVICE', 'COUNT']
                 
-                # Create grouped bar chart
-                fig2 = px.bar(
-                    subservice_freq,
-                    x='SERVICE',
-                    y='FREQ_MHZ',
-                    color='SUBSERVICE',
-                    title='Rata-rata Frekuensi per Subservice',
-                    labels={'SERVICE': 'Jenis Layanan', 'FREQ_MHZ': 'Rata-rata Frekuensi (MHz)', 'SUBSERVICE': 'Sub-layanan'}
+                # Limit to top 15 subservices for readability
+                if len(subservice_counts) > 15:
+                    subservice_counts = subservice_counts.head(15)
+                    title = 'Distribusi Sub-layanan (Top 15)'
+                else:
+                    title = 'Distribusi Sub-layanan'
+                
+                # Create horizontal bar chart
+                fig3 = px.bar(
+                    subservice_counts,
+                    y='SUBSERVICE',
+                    x='COUNT',
+                    color='COUNT',
+                    title=title,
+                    labels={'SUBSERVICE': 'Sub-layanan', 'COUNT': 'Jumlah'},
+                    orientation='h',
+                    color_continuous_scale='Viridis'
                 )
                 
                 # Update layout
-                fig2.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Rata-rata Frekuensi (MHz)')
+                fig3.update_layout(yaxis_title='Sub-layanan', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
                 
                 # Show plot
-                st.plotly_chart(fig2, use_container_width=True)
-            
-            # Subservice distribution
-            subservice_counts = df['SUBSERVICE'].value_counts().reset_index()
-            subservice_counts.columns = ['SUBSERVICE', 'COUNT']
-            
-            # Limit to top 15 subservices for readability
-            if len(subservice_counts) > 15:
-                subservice_counts = subservice_counts.head(15)
-                title = 'Distribusi Sub-layanan (Top 15)'
-            else:
-                title = 'Distribusi Sub-layanan'
-            
-            # Create horizontal bar chart
-            fig3 = px.bar(
-                subservice_counts,
-                y='SUBSERVICE',
-                x='COUNT',
-                color='COUNT',
-                title=title,
-                labels={'SUBSERVICE': 'Sub-layanan', 'COUNT': 'Jumlah'},
-                orientation='h',
-                color_continuous_scale='Viridis'
-            )
-            
-            # Update layout
-            fig3.update_layout(yaxis_title='Sub-layanan', xaxis_title='Jumlah', yaxis={'categoryorder':'total ascending'})
-            
-            # Show plot
-            st.plotly_chart(fig3, use_container_width=True)
+                st.plotly_chart(fig3, use_container_width=True)
         
         with dash_tab3:
-            st.markdown("### 🏙️ Distribusi Kota")
-            
-            # Create city statistics
-            city_counts = df['CITY'].value_counts().reset_index()
-            city_counts.columns = ['CITY', 'COUNT']
-            
-            # Limit to top 20 cities
-            if len(city_counts) > 20:
-                city_counts = city_counts.head(20)
-                title = 'Top 20 Kota berdasarkan Jumlah Pemancar'
-            else:
-                title = 'Kota berdasarkan Jumlah Pemancar'
-            
-            # Create horizontal bar chart
-            fig = px.bar(
-                city_counts,
-                y='CITY',
-                x='COUNT',
-                color='COUNT',
-                title=title,
-                labels={'CITY': 'Kota', 'COUNT': 'Jumlah Pemancar'},
-                orientation='h',
-                color_continuous_scale='Blues'
-            )
-            
-            # Update layout
-            fig.update_layout(yaxis_title='Kota', xaxis_title='Jumlah Pemancar', yaxis={'categoryorder':'total ascending'})
-            
-            # Show plot
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Distribution of services per city (heatmap)
-            city_service = pd.crosstab(df['CITY'], df['SERVICE'])
-            
-            # Limit to top 15 cities by total
-            if len(city_service) > 15:
-                city_totals = city_service.sum(axis=1)
-                top_cities = city_totals.nlargest(15).index
-                city_service = city_service.loc[top_cities]
-                title = 'Distribusi Layanan per Kota (Top 15 Kota)'
-            else:
-                title = 'Distribusi Layanan per Kota'
-            
-            # Create heatmap
-            fig2 = px.imshow(
-                city_service,
-                labels=dict(x="Jenis Layanan", y="Kota", color="Jumlah Pemancar"),
-                title=title,
-                aspect="auto",
-                color_continuous_scale='YlGnBu'
-            )
-            
-            # Update layout
-            fig2.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Kota')
-            
-            # Show plot
-            st.plotly_chart(fig2, use_container_width=True)
-            
-            # Create map of stations by city
-            st.markdown("#### Peta Distribusi Pemancar per Kota")
-            
-            # Create map with city markers
-            city_data = df.groupby('CITY').agg({
-                'SID_LAT': 'mean',
-                'SID_LONG': 'mean',
-                'STN_NAME': 'count'
-            }).reset_index()
-            
-            # Rename columns
-            city_data.rename(columns={'STN_NAME': 'COUNT'}, inplace=True)
-            
-            # Create map
-            city_map = folium.Map(location=[city_data['SID_LAT'].mean(), city_data['SID_LONG'].mean()], zoom_start=5, tiles="OpenStreetMap")
-            
-            # Add city markers with scaled sizes
-            for _, row in city_data.iterrows():
-                # Scale marker size based on count (min 10, max 40)
-                marker_size = min(40, max(10, int(10 * np.log10(row['COUNT']))))
+            if dash_tab3.open:
+                st.markdown("### 🏙️ Distribusi Kota")
                 
-                # Create popup content
-                popup_content = f"""
-                <div style="font-family: 'Segoe UI', sans-serif; min-width: 200px; max-width: 300px;">
-                    <h3 style="margin-bottom: 10px;">{row['CITY']}</h3>
-                    <p><b>Jumlah Pemancar:</b> {row['COUNT']:,}</p>
-                    <p><b>Koordinat:</b> {row['SID_LAT']:.6f}, {row['SID_LONG']:.6f}</p>
-                </div>
-                """
+                # Create city statistics
+                city_counts = get_cube_counts(cube, 'CITY').reset_index()
+                city_counts.columns = ['CITY', 'COUNT']
                 
-                # Create popup
-                popup = folium.Popup(folium.Html(popup_content, script=True), max_width=300)
+                # Limit to top 20 cities
+                if len(city_counts) > 20:
+                    city_counts = city_counts.head(20)
+                    title = 'Top 20 Kota berdasarkan Jumlah Pemancar'
+                else:
+                    title = 'Kota berdasarkan Jumlah Pemancar'
                 
-                # Add circle marker
-                folium.CircleMarker(
-                    location=[row['SID_LAT'], row['SID_LONG']],
-                    radius=marker_size,
-                    popup=popup,
-                    color='#3186cc',
-                    fill=True,
-                    fill_color='#3186cc',
-                    fill_opacity=0.7,
-                    tooltip=f"{row['CITY']} ({row['COUNT']} pemancar)"
-                ).add_to(city_map)
-            
-            # Add plugins
-            MiniMap().add_to(city_map)
-            
-            # Display map
-            folium_static(city_map, width=1000, height=500)
+                # Create horizontal bar chart
+                fig = px.bar(
+                    city_counts,
+                    y='CITY',
+                    x='COUNT',
+                    color='COUNT',
+                    title=title,
+                    labels={'CITY': 'Kota', 'COUNT': 'Jumlah Pemancar'},
+                    orientation='h',
+                    color_continuous_scale='Blues'
+                )
+                
+                # Update layout
+                fig.update_layout(yaxis_title='Kota', xaxis_title='Jumlah Pemancar', yaxis={'categoryorder':'total ascending'})
+                
+                # Show plot
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # Distribution of services per city (heatmap)
+                city_service = get_cube_crosstab(cube, 'CITY', 'SERVICE')
+                
+                # Limit to top 15 cities by total
+                if len(city_service) > 15:
+                    city_totals = city_service.sum(axis=1)
+                    top_cities = city_totals.nlargest(15).index
+                    city_service = city_service.loc[top_cities]
+                    title = 'Distribusi Layanan per Kota (Top 15 Kota)'
+                else:
+                    title = 'Distribusi Layanan per Kota'
+                
+                # Create heatmap
+                fig2 = px.imshow(
+                    city_service,
+                    labels=dict(x="Jenis Layanan", y="Kota", color="Jumlah Pemancar"),
+                    title=title,
+                    aspect="auto",
+                    color_continuous_scale='YlGnBu'
+                )
+                
+                # Update layout
+                fig2.update_layout(xaxis_title='Jenis Layanan', yaxis_title='Kota')
+                
+                # Show plot
+                st.plotly_chart(fig2, use_container_width=True)
+                
+                # Create map of stations by city
+                st.markdown("#### Peta Distribusi Pemancar per Kota")
+                
+                # Create map with city markers
+                city_data = get_cube_centroids(cube, 'CITY')
+                
+                # Create map
+                city_map = folium.Map(location=[city_data['SID_LAT'].mean(), city_data['SID_LONG'].mean()], zoom_start=5, tiles="OpenStreetMap")
+                
+                # Add city markers with scaled sizes
+                for _, row in city_data.iterrows():
+                    # Scale marker size based on count (min 10, max 40)
+                    marker_size = min(40, max(10, int(10 * np.log10(row['COUNT']))))
+                    
+                    # Create popup content
+                    popup_content = f"""
+                    <div style="font-family: 'Segoe UI', sans-serif; min-width: 200px; max-width: 300px;">
+                        <h3 style="margin-bottom: 10px;">{row['CITY']}</h3>
+                        <p><b>Jumlah Pemancar:</b> {row['COUNT']:,}</p>
+                        <p><b>Koordinat:</b> {row['SID_LAT']:.6f}, {row['SID_LONG']:.6f}</p>
+                    </div>
+                    """
+                    
+                    # Create popup
+                    popup = folium.Popup(folium.Html(popup_content, script=True), max_width=300)
+                    
+                    # Add circle marker
+                    folium.CircleMarker(
+                        location=[row['SID_LAT'], row['SID_LONG']],
+                        radius=marker_size,
+                        popup=popup,
+                        color='#3186cc',
+                        fill=True,
+                        fill_color='#3186cc',
+                        fill_opacity=0.7,
+                        tooltip=f"{row['CITY']} ({row['COUNT']} pemancar)"
+                    ).add_to(city_map)
+                
+                # Add plugins
+                MiniMap().add_to(city_map)
+                
+                # Display map
+                folium_static(city_map, width=1000, height=500)
     else:
         # No data available - show dashboard placeholder
         st.markdown('<p class="sub-header">📊 Dashboard Informasi Frekuensi</p>', unsafe_allow_html=True)
@@ -1517,9 +4025,11 @@ Semarang,PT Radio Indonesia,Semarang Station,Radio,AM Radio,-6.9932,110.4203,540
         6. **Penanganan Data Besar**:
            - Untuk dataset besar (>5000 titik), sistem menggunakan clustering otomatis
            - Anda dapat memilih metode sampling untuk mengoptimalkan performa:
-             - **Random**: Memilih titik secara acak (cepat, tetapi mungkin tidak representatif)
-             - **Cluster**: Menggunakan K-means clustering untuk memilih titik yang representatif
-             - **Grid**: Membagi area menjadi grid dan mengambil sampel dari setiap sel
+             - **Stratified** (bawaan): Mengambil sampel sebanding per layanan dan per sel wilayah, dengan jatah minimum untuk layanan yang jarang; titik tetap sama saat halaman dimuat ulang dan hanya bertambah saat jumlah marker dinaikkan
+             - **Random**: Memilih titik secara acak dengan seed tetap (cepat, tetapi mungkin tidak representatif)
+             - **Cluster**: Memperhalus grid spasial hingga jumlah sel terisi mendekati jumlah marker, lalu mengambil titik terdekat ke pusat sel terpadat
+             - **Grid**: Membagi area menjadi grid dan mengambil satu titik dari setiap sel yang terisi
+           - Mode **Viewport (semua titik)** tidak mengambil sampel: hanya titik pada area peta yang terlihat yang dimuat
         
         > 💡 **Tip**: Untuk analisis interferensi, gunakan fitur "buffer" dengan mengaktifkan tombol lingkaran pada alat drawing, kemudian atur radius sesuai kebutuhan
         """)
@@ -1585,7 +4095,7 @@ Semarang,PT Radio Indonesia,Semarang Station,Radio,AM Radio,-6.9932,110.4203,540
         - **Analisis Data**: Pandas dan NumPy
         - **Kartografi**: OpenStreetMap, Mapbox, ESRI, CartoDB
         - **UI/UX**: HTML/CSS dengan font-awesome icons
-        - **Optimasi**: K-means clustering dan sampling grid untuk penanganan dataset besar
+        - **Optimasi**: Sampling stratified, grid spasial, dan indeks viewport untuk penanganan dataset besar
         """)
     
     # Credits and footer